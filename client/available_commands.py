@@ -35,8 +35,13 @@ class AvailableCommands(Widget):
                 border_style="green",
                 title="Register to play!",
             )
+        lines = self.available_commands
+        queued = self.main_app.command_queue.labels()
+        if queued:
+            lines = lines + ["", "Queued:"] + queued
+
         return Panel(
-            Padding(Align.left("\n".join(self.available_commands))),
+            Padding(Align.left("\n".join(lines))),
             border_style="green",
             title="Allowed Moves",
         )
@@ -0,0 +1,63 @@
+"""Our own copy of the player's command queue, so commands show up as soon as they're typed.
+
+Commands only run once per tick, and the server takes a while to answer. Instead of waiting,
+each command gets a number (`seq`) and is shown as queued right away. Whenever the server
+tells us what's really in the queue, our copy is corrected to match it.
+"""
+
+
+class CommandQueue:
+    def __init__(self) -> None:
+        self._next_seq = 1
+        self._answered = 0  # The last `seq` the server told us about.
+        # What each queued command was, the next one to run first.
+        self._queue: dict[int, str] = {}
+
+    def labels(self) -> list[str]:
+        return list(self._queue.values())
+
+    def push(self, label: str) -> int:
+        """Queues a command, returns the `seq` to send it with."""
+        seq = self._take_seq()
+        self._queue[seq] = label
+        return seq
+
+    def nvm(self) -> int:
+        """Drops the next command, like the server does on `!nvm`."""
+        if self._queue:
+            del self._queue[next(iter(self._queue))]
+        return self._take_seq()
+
+    def clear(self) -> int:
+        self._queue.clear()
+        return self._take_seq()
+
+    def answered(self, seq: int | None, queue: list[int] | None) -> bool:
+        """Corrects our copy with the answer to one of our commands.
+
+        Returns True if the answer is what we expected, so there's nothing to tell the player.
+        """
+        if seq is None or queue is None:
+            return False
+
+        rejected = seq in self._queue and seq not in queue
+        self._answered = max(self._answered, seq)
+        self._sync(queue)
+        return not rejected
+
+    def ran(self, queue: list[int]) -> None:
+        """Corrects our copy after a tick ran one of the commands."""
+        self._sync(queue)
+
+    def _sync(self, queue: list[int]) -> None:
+        # The server's queue, then whatever it hasn't got to yet.
+        synced = {seq: self._queue[seq] for seq in queue if seq in self._queue}
+        for seq, label in self._queue.items():
+            if seq > self._answered:
+                synced[seq] = label
+        self._queue = synced
+
+    def _take_seq(self) -> int:
+        seq = self._next_seq
+        self._next_seq += 1
+        return seq
@@ -1,8 +1,11 @@
 from __future__ import annotations
 
+import asyncio
+import copy
 import functools
 import typing
 
+from log_history import LogHistory
 from rich import box
 from rich.layout import Layout
 from rich.panel import Panel
@@ -14,6 +17,8 @@ from common.schemas import (
     ActionNoTargetRequest,
     ActionWithTargetRequest,
     ChatMessage,
+    ChatScope,
+    CommandBatch,
     InitializePlayer,
     MovementRequest,
 )
@@ -48,15 +53,16 @@ class ConsoleLog(Widget):
     )
     ACTIONS_MESSAGE = "Actions are prefixed with !, use them to control your bug."
 
-    console_log: list[str] = [HELP_MESSAGE, REGISTER_MESSAGE, ACTIONS_MESSAGE]
-    full_log: list[str] = [HELP_MESSAGE, REGISTER_MESSAGE, ACTIONS_MESSAGE]
     reverse_log: Reactive[bool] = Reactive(False)
     scroll: Reactive[int] = Reactive(0)
 
-    def render(self) -> Panel:
-        if len(self.console_log) > 7:
-            self.console_log.pop(0)
+    def __init__(self, name: str | None = None) -> None:
+        self.history = LogHistory()
+        for message in (self.HELP_MESSAGE, self.REGISTER_MESSAGE, self.ACTIONS_MESSAGE):
+            self.history.append(message)
+        super().__init__(name)
 
+    def render(self) -> Panel:
         display_log = self.get_display_logs()
 
         return Panel(
@@ -73,25 +79,26 @@ class ConsoleLog(Widget):
             # IT'S ALWAYS THE NAME OF THE ENTITY APPARENTLY BUT I CANNOT SQUASH IT
             # I DON'T THINK WE HAVE ANY OTHER 1-WORD MESSAGE ANYWAYS.
             return
-        self.console_log.append(log)
-        self.full_log.append(log)
-        self.refresh()
+        self.history.append(log)
+        # No need to refresh, this is drawn as part of the console, which is redrawn after this.
+
+    def clear(self) -> None:
+        self.history.clear()
+        self.scroll = 0
 
     def get_display_logs(self) -> list[str]:
         """Returns the logs to be displayed, reversed and/or scrolled if necesary."""
         MAX_LOGS = 7
 
-        display_log = self.console_log
-
-        total_scroll_upper = MAX_LOGS + 1 + self.scroll
-
         if self.scroll:
             # Shift everything "up".
-            display_log = ["You're viewing old messages."] + self.full_log[
-                -total_scroll_upper : -self.scroll
-            ]
+            display_log = ["You're viewing old messages."] + self.history.latest(
+                MAX_LOGS + 1, skip=self.scroll
+            )
+        else:
+            display_log = self.history.latest(MAX_LOGS)
         if self.reverse_log:
-            display_log = list(reversed(display_log))
+            display_log.reverse()
 
         return display_log
 
@@ -102,7 +109,7 @@ class ConsoleLog(Widget):
 
     def scroll_towards_old(self) -> None:
         """Moves the scroll towards the older logs."""
-        if self.scroll < len(self.full_log):
+        if self.scroll < len(self.history):
             self.scroll += 1
 
 
@@ -115,14 +122,23 @@ class Console(Widget):
     ALL_COMMANDS = {
         "/register [USERNAME]": "Use this command to set your username and join the game.",
         "/reverse_console": "Reverses the way console logs are displayed.",
+        "/say [MESSAGE]": "Only the bugs in your room will hear you.",
+        "/shout [MESSAGE]": "The bugs in your room and the rooms next to it will hear you.",
+        "/whisper [TARGET] [MESSAGE]": "Only the target will hear you.",
+        "chat": "Anything else you type is sent to the entire forest.",
         "actions": "Actions are prefixed with !, use them to control your bug.",
         "movement": "You can use `!move [direction]` or numpad keys (2, 4, 6, 8)",
+        "batches": "Separate actions with ; to queue them all at once, like `!move north; !spit`",
     }
 
     message = ""
     console_log: list[str] = []
     out: ConsoleLog = ConsoleLog()
     already_registered: bool = False
+    # The commands of the batch being put together, see `send_batch`.
+    _batch: list[
+        ActionNoTargetRequest | ActionWithTargetRequest | MovementRequest
+    ] | None = None
 
     def __init__(self, main_app: GameInterface, name: str | None = None) -> None:
         self.main_app = main_app
@@ -188,7 +204,7 @@ class Console(Widget):
             case _:
                 self.message += key
 
-        self.refresh()
+        self.main_app.renderer.mark(self)
 
     async def handle_message(self) -> str:
         """Handles input from the user.
@@ -209,46 +225,109 @@ class Console(Widget):
                     log_display = await self.register(username)
                 else:
                     log_display = "You already registered!"
+            case ["/say", *words] if words:
+                log_display = await self.send_chat_message(" ".join(words), "room")
+            case ["/shout", *words] if words:
+                log_display = await self.send_chat_message(" ".join(words), "nearby")
+            case ["/whisper", target, *words] if words:
+                log_display = await self.whisper(target, " ".join(words))
+            case _ if commands := split_batch(self.message):
+                log_display = await self.send_batch(commands)
+            case _ if self.message.startswith("!"):
+                log_display = await self.handle_command(self.message)
+            case _:
+                # Treat commands without a leading slash as "chat" commands.
+                log_display = await self.send_chat_message(self.message)
+
+        return log_display
+
+    async def handle_command(self, command: str) -> str:
+        """Handles a single action or move. Returns an empty string if it was sent."""
+        match command.split():
             case ["!move", direction]:
                 if direction in ["north", "south", "east", "west"]:
-                    log_display = await self.handle_movement(direction)
+                    return await self.handle_movement(direction)
                 else:
-                    log_display = f"{direction} isn't a direction!"
-            case [("!flee" | "!nvm" | "!clear") as action]:
-                log_display = await self.handle_action_without_target(action)
-            case [action] if self.message.startswith("!"):
-                log_display = await self.handle_action_without_target(action)
-            case [action, *target] if self.message.startswith("!"):
+                    return f"{direction} isn't a direction!"
+            case [action]:
+                return await self.handle_action_without_target(action)
+            case [action, *target]:
                 full_target_name = " ".join(target)
-                log_display = await self.handle_action_with_target(
-                    action, full_target_name
-                )
-            case _:
-                # Treat commands without a leading slash as "chat" commands.
-                log_display = await self.send_chat_message()
+                return await self.handle_action_with_target(action, full_target_name)
 
-        return log_display
+        return ""
+
+    @enforce_initialization
+    async def send_batch(self, commands: list[str]) -> str:
+        """Sends several commands in a single message, so they're queued together.
+
+        If any of them is wrong none of them are sent, the server does the same.
+        """
+        saved_queue = copy.deepcopy(self.main_app.command_queue)
+        self._batch = []
+        try:
+            for command in commands:
+                error = await self.handle_command(command)
+                if error:
+                    self.main_app.command_queue = saved_queue
+                    return error
+            requests = self._batch
+        finally:
+            self._batch = None
+
+        batch = CommandBatch(type="batch", commands=requests)
+        await self.main_app.websocket.send(batch.json())
+        return ""
+
+    async def send_request(
+        self, request: ActionNoTargetRequest | ActionWithTargetRequest | MovementRequest
+    ) -> None:
+        """Sends a command to the server, unless it's part of a batch that's being put together."""
+        if self._batch is not None:
+            self._batch.append(request)
+        else:
+            await self.main_app.websocket.send(request.json())
 
     async def register(self, username: str) -> str:
         """Sends an init request to the server to initialize our player."""
         self.already_registered = True
 
-        p_request = InitializePlayer(type="init", username=username)
+        map_hash, cached_chunks = await asyncio.to_thread(
+            self.main_app.map_cache.latest
+        )
+        p_request = InitializePlayer(
+            type="init",
+            username=username,
+            map_hash=map_hash,
+            cached_chunks=cached_chunks,
+        )
         await self.main_app.websocket.send(p_request.json())
 
         self.initialized = True
         return ""
 
     @enforce_initialization
-    async def send_chat_message(self) -> str:
+    async def send_chat_message(
+        self, message: str, scope: ChatScope = "global", target: int | None = None
+    ) -> str:
         response = ChatMessage(
             type="chat",
             player_name=self.main_app.name,
-            chat_message=self.message,
+            chat_message=message,
+            scope=scope,
+            target=target,
         )
         await self.main_app.websocket.send(response.json())
         return ""
 
+    async def whisper(self, target: str, message: str) -> str:
+        target_uid = self.get_target(target)
+
+        if target_uid:
+            return await self.send_chat_message(message, "whisper", target_uid)
+        else:
+            return f"`{target}` isn't around to hear you!"
+
     @enforce_initialization
     async def handle_action_with_target(self, action: str, target: str) -> str:
         target_uid = self.get_target(target)
@@ -259,20 +338,31 @@ class Console(Widget):
                 action=action[1:],
                 target=target_uid,
                 player=self.main_app.uid,
+                seq=self.queue_command(f"{action} {target}"),
             )
-            await self.main_app.websocket.send(message.json())
+            await self.send_request(message)
             return ""
         else:
             return f"`{target}` doesn't exist!"
 
     @enforce_initialization
     async def handle_action_without_target(self, action: str) -> str:
+        match action:
+            case "!nvm":
+                seq = self.main_app.command_queue.nvm()
+            case "!clear":
+                seq = self.main_app.command_queue.clear()
+            case _:
+                seq = self.main_app.command_queue.push(action)
+        self.main_app.renderer.mark(self.main_app.available_commands_widget)
+
         message = ActionNoTargetRequest(
             type="action",
             action=action[1:],
             player=self.main_app.uid,
+            seq=seq,
         )
-        await self.main_app.websocket.send(message.json())
+        await self.send_request(message)
         return ""
 
     @enforce_initialization
@@ -281,8 +371,9 @@ class Console(Widget):
             type="move",
             direction=direction,
             player=self.main_app.uid,
+            seq=self.queue_command(f"!move {direction}"),
         )
-        await self.main_app.websocket.send(message.json())
+        await self.send_request(message)
         return ""
 
     @enforce_initialization
@@ -291,19 +382,26 @@ class Console(Widget):
         self.out.add_log(keybind_dir)
         return await self.handle_movement(KEYBINDS[keybind_dir])
 
+    def queue_command(self, label: str) -> int:
+        """Shows the command as queued right away, returns the `seq` to send it with."""
+        self.main_app.renderer.mark(self.main_app.available_commands_widget)
+        return self.main_app.command_queue.push(label)
+
     def get_target(self, target_name: str) -> int | None:
         """Gets a target name and then returns the target's UID.
 
+        The name can have an ordinal (`Mite#2`) or be cut short (`Mi`), like in the entities list.
         Returns None if the target name doesn't exist.
         """
-        target_uid = None
-        # Sorry for this ugliness :'(
-        for uid, name in self.main_app.entities.entities.items():
-            if name == target_name:
-                target_uid = uid
-                break
-
-        return target_uid
+        return self.main_app.entities.names.find(target_name)
+
+
+def split_batch(message: str) -> list[str] | None:
+    """Splits a message into the commands of a batch, or returns None if it isn't one."""
+    commands = [command.strip() for command in message.split(";") if command.strip()]
+    if len(commands) > 1 and all(command.startswith("!") for command in commands):
+        return commands
+    return None
 
 
 def display_help(all_commands: dict[str, str]) -> str:
@@ -1,18 +1,94 @@
+import bisect
+
 from rich.align import Align
 from rich.padding import Padding
 from rich.panel import Panel
-from textual.reactive import Reactive
 from textual.widget import Widget
 
 
+class NameIndex:
+    """The entities around us by name, so targets can be found without looking at all of them.
+
+    Entities sharing a name are told apart by an ordinal: the first `Mite` to show up is
+    `Mite` (or `Mite#1`), the next one `Mite#2`, and so on. An entity keeps its ordinal
+    while it's around. Names are matched ignoring case, and a target can be shortened to
+    any prefix that only one name starts with.
+    """
+
+    def __init__(self) -> None:
+        self.labels: dict[int, str] = {}  # What each entity is shown as, by UID.
+        self._ordinals: dict[int, tuple[str, int]] = {}  # Name key and ordinal by UID.
+        # The UIDs of the entities with each name, by ordinal. Ordinals only go up while
+        # someone with that name is around, so the first one in here is the oldest.
+        self._by_name: dict[str, dict[int, int]] = {}
+        self._next_ordinal: dict[str, int] = {}
+        self._sorted_names: list[str] = []  # For prefix completion.
+
+    def add(self, uid: int, name: str) -> None:
+        if uid in self.labels:
+            return
+
+        key = name.casefold()
+        uids = self._by_name.get(key)
+        if uids is None:
+            uids = self._by_name[key] = {}
+            self._next_ordinal[key] = 1
+            bisect.insort(self._sorted_names, key)
+
+        ordinal = self._next_ordinal[key]
+        self._next_ordinal[key] += 1
+        uids[ordinal] = uid
+        self._ordinals[uid] = (key, ordinal)
+        self.labels[uid] = name if ordinal == 1 else f"{name}#{ordinal}"
+
+    def remove(self, uid: int) -> None:
+        if uid not in self.labels:
+            return
+
+        del self.labels[uid]
+        key, ordinal = self._ordinals.pop(uid)
+        uids = self._by_name[key]
+        del uids[ordinal]
+        if not uids:
+            del self._by_name[key], self._next_ordinal[key]
+            del self._sorted_names[bisect.bisect_left(self._sorted_names, key)]
+
+    def clear(self) -> None:
+        self.__init__()
+
+    def find(self, target: str) -> int | None:
+        """The UID of the entity with the given name, ordinal or name prefix, if there's one."""
+        name, _, ordinal = target.casefold().rpartition("#")
+        if name and ordinal.isdigit():
+            uids = self._by_name.get(self._complete(name) or name)
+            return uids.get(int(ordinal)) if uids else None
+
+        uids = self._by_name.get(self._complete(target.casefold()) or "")
+        if not uids:
+            return None
+        return next(iter(uids.values()))  # The oldest one of them.
+
+    def _complete(self, prefix: str) -> str | None:
+        """The name the prefix is short for, if there's exactly one name it can be."""
+        if prefix in self._by_name:
+            return prefix
+
+        start = bisect.bisect_left(self._sorted_names, prefix)
+        matches = self._sorted_names[start : start + 2]
+        if matches and matches[0].startswith(prefix):
+            if len(matches) == 1 or not matches[1].startswith(prefix):
+                return matches[0]
+        return None
+
+
 class Entities(Widget):
-    entities: Reactive[dict[int, str]] = Reactive({})
+    def __init__(self, name: str | None = None) -> None:
+        self.names = NameIndex()
+        super().__init__(name)
 
     def render(self) -> Panel:
         return Panel(
-            Padding(
-                Align.left("\n".join(list(self.entities.values())), vertical="top")
-            ),
+            Padding(Align.left("\n".join(self.names.labels.values()), vertical="top")),
             border_style="green",
             title="Entities",
         )
@@ -0,0 +1,77 @@
+"""The console's history, kept at a fixed size however long you play."""
+import collections
+import os
+import queue
+import threading
+
+LOG_CAPACITY = 500  # How many lines are kept around to scroll back through.
+SPILL_PATH = os.path.join(
+    os.path.expanduser("~"), ".cache", "curse-of-the-mites", "console.log"
+)
+
+
+class LogHistory:
+    """The latest lines of the console, in a ring buffer.
+
+    Once the buffer is full, the oldest line is appended to a file on disk to make room for
+    the new one. The file is written on a thread of its own, whatever lines piled up in one go,
+    so the event loop never waits on the disk. Writing to it is best effort, like the map cache.
+    """
+
+    def __init__(
+        self, capacity: int = LOG_CAPACITY, spill_path: str | None = SPILL_PATH
+    ) -> None:
+        self._lines: collections.deque[str] = collections.deque(maxlen=capacity)
+        self.spill_path = spill_path
+        self._spilled: queue.SimpleQueue[
+            str
+        ] | None = None  # Lines left for the writer.
+
+    def __len__(self) -> int:
+        return len(self._lines)
+
+    def append(self, line: str) -> None:
+        if len(self._lines) == self._lines.maxlen:
+            self._spill(self._lines[0])
+        self._lines.append(line)
+
+    def latest(self, count: int, skip: int = 0) -> list[str]:
+        """The `count` lines before the `skip` newest ones, the oldest first.
+
+        Only looks at the lines it returns, so it doesn't matter how full the buffer is.
+        """
+        stop = min(skip + count, len(self._lines))
+        return [self._lines[-i] for i in range(stop, skip, -1)]
+
+    def clear(self) -> None:
+        self._lines.clear()
+
+    def _spill(self, line: str) -> None:
+        if self.spill_path is None:
+            return
+
+        if self._spilled is None:
+            self._spilled = queue.SimpleQueue()
+            threading.Thread(
+                target=self._write_spilled,
+                args=(self._spilled,),
+                name="log-spill",
+                daemon=True,
+            ).start()
+        self._spilled.put(line)
+
+    def _write_spilled(self, spilled: queue.SimpleQueue[str]) -> None:
+        """Appends the spilled lines to the file as they come in, runs on its own thread."""
+        try:
+            os.makedirs(os.path.dirname(self.spill_path), exist_ok=True)
+            with open(self.spill_path, "a") as file:
+                while True:
+                    lines = [spilled.get()]
+                    # Everything that came in since the last write goes in the same one.
+                    while not spilled.empty():
+                        lines.append(spilled.get())
+
+                    file.write("".join(f"{line}\n" for line in lines))
+                    file.flush()
+        except OSError:
+            self.spill_path = None  # Don't keep trying, the lines just get dropped.
@@ -2,19 +2,27 @@ import json
 from typing import Optional
 
 from available_commands import AvailableCommands
+from command_queue import CommandQueue
 from console import Console
 from entities import Entities
-from map import Map, RenderData
+from map import ChunkStore, Map
+from map_cache import MapCache
+from render_scheduler import RenderScheduler
 from websocket_app import WebsocketApp
 
 from common.schemas import (
     DEATH,
+    SERVER_RESPONSE,
     WIN,
     ActionResponse,
     ActionUpdateMessage,
+    BatchResponse,
+    ChatDigest,
     ChatMessage,
     LevelUpNotification,
+    MapUpdate,
     MovementUpdateMessage,
+    QueueUpdate,
     RegistrationSuccessful,
     RoomChangeUpdate,
 )
@@ -53,9 +61,15 @@ class GameInterface(WebsocketApp):
             main_app=self, name="Available Commands"
         )
         self.map = Map(main_app=self, name="Map")
+        self.map_cache = MapCache()
+        self.map_chunks = ChunkStore()
+        self.command_queue = CommandQueue()
 
         self.entities = Entities()
 
+        self.renderer = RenderScheduler()
+        self.renderer.start(self)
+
         grid.place(
             map_area=self.map,
             entities_area=self.entities,
@@ -63,18 +77,37 @@ class GameInterface(WebsocketApp):
             available_commands_area=self.available_commands_widget,
         )
 
+    def decode(self, message: str | bytes) -> SERVER_RESPONSE:
+        event = deserialize_server_response(json.loads(message))
+
+        # We're on the decoding thread, so this is where the saved chunks are read and written.
+        match event:
+            case RegistrationSuccessful():
+                self.map_cache.use(event.map_hash)
+                self.map_cache.fill(event.map)
+            case MovementUpdateMessage(map_update=MapUpdate() as map_update):
+                self.map_cache.fill(map_update)
+
+        return event
+
     async def handle_messages(self):
         """Allows receiving messages from a websocket and handling them."""
-        async for message in self.websocket:
+        async for event in self.events():
             if self.won or self.lost:
                 continue  # No message processing for you.
 
-            event = deserialize_server_response(json.loads(message))
             match event:
                 case ChatMessage():
-                    self.console_widget.out.add_log(
-                        f"{event.player_name}: {event.chat_message}"
-                    )
+                    self.console_widget.out.add_log(format_chat_message(event))
+                case ChatDigest():
+                    for chat_message in event.messages:
+                        self.console_widget.out.add_log(
+                            format_chat_message(chat_message)
+                        )
+                    if event.skipped:
+                        self.console_widget.out.add_log(
+                            f"... and {event.skipped} more messages you missed."
+                        )
                 case RegistrationSuccessful():
                     self.initialized = True
                     self.name = event.player.name
@@ -82,21 +115,16 @@ class GameInterface(WebsocketApp):
                     self.available_commands_widget.add_commands(
                         event.player.allowed_actions
                     )
-                    self.available_commands_widget.refresh()
+                    self.renderer.mark(self.available_commands_widget)
 
                     self.console_widget.name = self.name
                     self.console_widget.out.add_log(
                         f"Correctly registered as {self.name}"
                     )
-                    self.console_widget.refresh()
 
-                    tiles = [
-                        RenderData(room["color"], room["x"], room["y"], room["players"])
-                        for room in event.map.map
-                    ]
-
-                    self.map.render_from(tiles)
-                    self.map.refresh()
+                    tiles_changed = self.map_chunks.apply(event.map)
+                    self.map.render_from(self.map_chunks, tiles_changed)
+                    self.renderer.mark(self.map)
 
                     self._handle_room_change(event.map.entities)
                 case MovementUpdateMessage():
@@ -104,22 +132,36 @@ class GameInterface(WebsocketApp):
 
                     map_update = event.map_update
                     if map_update is not None:
-                        tiles = [
-                            RenderData(
-                                room["color"], room["x"], room["y"], room["players"]
-                            )
-                            for room in map_update.map
-                        ]
                         self.console_widget.out.add_log(
                             map_update.entities[-1].entity_name
                         )
                         self._handle_room_change(map_update.entities)
 
-                        self.map.render_from(tiles)
-                        self.map.refresh()
-                    self.available_commands_widget.refresh()
+                        tiles_changed = self.map_chunks.apply(map_update)
+                        self.map.render_from(self.map_chunks, tiles_changed)
+                        self.renderer.mark(self.map)
+                    self.renderer.mark(self.available_commands_widget)
                 case ActionResponse():
-                    self.console_widget.out.add_log(event.response)
+                    # The command already shows up as queued, only say something if it wasn't.
+                    if not self.command_queue.answered(event.seq, event.queue):
+                        self.console_widget.out.add_log(event.response)
+                    self.renderer.mark(self.available_commands_widget)
+                case BatchResponse():
+                    answers = [
+                        self.command_queue.answered(seq, event.queue)
+                        for seq in event.seqs
+                    ]
+                    if not (event.applied and all(answers)):
+                        if not event.applied:
+                            self.console_widget.out.add_log(
+                                "None of those commands were queued:"
+                            )
+                        for response in event.responses:
+                            self.console_widget.out.add_log(response)
+                    self.renderer.mark(self.available_commands_widget)
+                case QueueUpdate():
+                    self.command_queue.ran(event.queue)
+                    self.renderer.mark(self.available_commands_widget)
                 case ActionUpdateMessage():
                     self.console_widget.out.add_log(event.message)
                 case RoomChangeUpdate():
@@ -144,30 +186,24 @@ class GameInterface(WebsocketApp):
                     # TODO: more properly display the death.
                     self.initialized = False
                     self.lost = True
-                    self.map.refresh()
+                    self.renderer.mark(self.map)
                     self.console_widget.message = ""
-                    self.console_widget.out.console_log = []
-                    self.console_widget.out.full_log = (
-                        self.console_widget.out.console_log
-                    )
+                    self.console_widget.out.clear()
                 case WIN():
                     self.initialized = False
                     self.won = True  # A happy kind of game over :)
-                    self.map.refresh()
+                    self.renderer.mark(self.map)
                     self.console_widget.message = ""
-                    self.console_widget.out.console_log = []
-                    self.console_widget.out.full_log = (
-                        self.console_widget.out.console_log
-                    )
+                    self.console_widget.out.clear()
                 case _:
                     raise NotImplementedError(f"Unknown event {event!r}")
 
-            self.console_widget.refresh()
+            # Everything ends up in the console, it gets redrawn with the rest on the next frame.
+            self.renderer.mark(self.console_widget)
 
     def _handle_room_change(self, rc_updates: list[RoomChangeUpdate]) -> None:
-        self.entities.entities = (
-            {}
-        )  # All the mobs from the room we left aren't here anymore.
+        # All the mobs from the room we left aren't here anymore.
+        self.entities.names.clear()
 
         self._handle_rc_updates(rc_updates)
 
@@ -175,12 +211,18 @@ class GameInterface(WebsocketApp):
         for rc in rc_updates:
             if rc.enters:
                 if not rc.entity_uid == self.uid:
-                    self.entities.entities[rc.entity_uid] = rc.entity_name
+                    self.entities.names.add(rc.entity_uid, rc.entity_name)
             else:
-                if rc.entity_uid in self.entities.entities:
-                    del self.entities.entities[rc.entity_uid]
+                self.entities.names.remove(rc.entity_uid)
+
+        self.renderer.mark(self.entities)
+
 
-        self.entities.refresh()
+def format_chat_message(message: ChatMessage) -> str:
+    prefix = {"room": "[room] ", "nearby": "[nearby] ", "whisper": "[whisper] "}
+    return (
+        f"{prefix.get(message.scope, '')}{message.player_name}: {message.chat_message}"
+    )
 
 
 try:
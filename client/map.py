@@ -1,36 +1,121 @@
 import typing
-from dataclasses import dataclass
 
 from rich.align import Align
+from rich.console import Console, ConsoleOptions, RenderResult
+from rich.measure import Measurement
 from rich.padding import Padding
 from rich.panel import Panel
-from rich.table import Table
+from rich.style import Style
 from rich.text import Text
-from textual.reactive import Reactive
 from textual.widget import Widget
 
+from common.schemas import MapChunk, MapUpdate
+
 if typing.TYPE_CHECKING:
     from main import GameInterface
 
+MAP_WIDTH = 35  # How many tiles of the map are shown.
+MAP_HEIGHT = 30
+# The view only scrolls when we get this close to its edge, so most moves only redraw a few tiles.
+SCROLL_MARGIN = 6
+
+TILE = "▆ "
+EMPTY_CELL = (TILE, Style.null())
+OUR_PLAYER_CELL = ("@ ", Style(color="yellow"))
+PLAYER_CELL = ("@ ", Style(color="blue"))
+
+Cell = tuple[str, Style]
+
+
+class ChunkStore:
+    """The chunks of the map around us, and who's standing on them.
+
+    The server tells us which chunks to forget as we move away from them, so this never holds
+    more than the bit of the map around us. The tiles are also kept by their location, so
+    drawing a tile doesn't need to look for it.
+
+    Updates need to go through `MapCache.fill` first, for the chunks we have saved.
+    """
+
+    def __init__(self) -> None:
+        self.chunks: dict[tuple[int, int], MapChunk] = {}
+        self.colors: dict[
+            tuple[int, int], tuple[int, int, int]
+        ] = {}  # Color of each tile.
+        self.location: tuple[int, int] = (0, 0)
+        self.players: dict[
+            tuple[int, int], list[int]
+        ] = {}  # UIDs of the players on each tile.
+
+    def apply(self, update: MapUpdate) -> bool:
+        """Applies an update from the server, returns True if the tiles changed."""
+        changed = bool(update.forget or update.chunks)
+
+        for chunk_location in update.forget:
+            chunk = self.chunks.pop(tuple(chunk_location), None)
+            if chunk is not None:
+                for x, y, _ in chunk.tiles:
+                    self.colors.pop((x, y), None)
+        for chunk in update.chunks:
+            self._add_chunk(chunk)
+
+        self.location = update.location
+        self.players = {}
+        for player in update.players:
+            self.players.setdefault((player["x"], player["y"]), []).append(
+                player["uid"]
+            )
+
+        return changed
+
+    def _add_chunk(self, chunk: MapChunk) -> None:
+        self.chunks[(chunk.x, chunk.y)] = chunk
+        for x, y, kind in chunk.tiles:
+            self.colors[(x, y)] = chunk.kinds[kind]["color"]
+
+
+class MapGrid:
+    """The cells of the map, as a renderable that only rebuilds the rows that changed."""
 
-@dataclass
-class RenderData:
-    color: tuple[int, int, int]
-    x: int
-    y: int
-    players: list
+    def __init__(self, width: int = MAP_WIDTH, height: int = MAP_HEIGHT) -> None:
+        self.width = width
+        self.height = height
+        self.cells: list[list[Cell]] = [[EMPTY_CELL] * width for _ in range(height)]
+        self._rows: list[Text | None] = [
+            None
+        ] * height  # None when the row needs rebuilding.
 
+    def set(self, x: int, y: int, cell: Cell) -> None:
+        if self.cells[y][x] != cell:
+            self.cells[y][x] = cell
+            self._rows[y] = None
 
-def make_map_grid() -> Table:
-    map_grid = Table.grid()
+    def __rich_console__(
+        self, console: Console, options: ConsoleOptions
+    ) -> RenderResult:
+        for y, row in enumerate(self._rows):
+            if row is None:
+                row = self._rows[y] = Text.assemble(*self.cells[y], no_wrap=True)
+            yield row
 
-    for _ in range(50):
-        map_grid.add_column()
+    def __rich_measure__(
+        self, console: Console, options: ConsoleOptions
+    ) -> Measurement:
+        return Measurement(self.width * len(TILE), self.width * len(TILE))
 
-    for _ in range(30):
-        map_grid.add_row(*("▆ " for _ in range(50)))
 
-    return map_grid
+_tile_styles: dict[tuple[int, int, int], Cell] = {}
+
+
+def tile_cell(color: tuple[int, int, int]) -> Cell:
+    """The cell of a tile of the given color. There's only a handful of colors, so they're cached."""
+    cell = _tile_styles.get(color)
+    if cell is None:
+        cell = _tile_styles[color] = (
+            TILE,
+            Style(color=f"rgb({color[0]},{color[1]},{color[2]})"),
+        )
+    return cell
 
 
 STORY: list[str] = [
@@ -62,11 +147,13 @@ def WIN(name: str) -> list[str]:
 
 
 class Map(Widget):
-
-    grid = Reactive(make_map_grid())
-
     def __init__(self, main_app: "GameInterface", name: str | None = None):
         self.main_app = main_app
+        self.grid = MapGrid()
+        self.origin: tuple[int, int] | None = None  # Map location of the top left cell.
+        self._player_cells: set[
+            tuple[int, int]
+        ] = set()  # Where we drew players last time.
         super().__init__(name)
 
     def render(self) -> Panel:
@@ -94,41 +181,46 @@ class Map(Widget):
             title="Map",
         )
 
-    def render_from(self, tiles: list[RenderData]) -> None:
-        """Renders the map using the given tiles"""
-        map_grid = Table.grid()
-
-        for _ in range(35):
-            map_grid.add_column()
-
-        for i in range(30):
-            usable_tiles = [tile for tile in tiles if tile.y == i]
-            display: list[Text] = []
-
-            for y in range(35):
-                for tile in usable_tiles:
-                    if tile.x == y:
-                        for player in tile.players:
-                            display.append(
-                                Text(
-                                    "@ ",
-                                    "yellow"
-                                    if player["uid"] == self.main_app.uid
-                                    else "blue",
-                                )
-                            )
-                            break
-                        else:
-                            display.append(
-                                Text(
-                                    "▆ ",
-                                    f"rgb({','.join((str(i) for i in tile.color))})",
-                                )
-                            )
-                        break
-                else:
-                    display.append(Text("▆ "))
-
-            map_grid.add_row(*display)
-
-        self.grid = map_grid
+    def render_from(self, store: ChunkStore, tiles_changed: bool = True) -> None:
+        """Draws what changed on the map.
+
+        Usually that's only where the players were and are now, unless the view scrolled or the
+        tiles changed.
+        """
+        x, y = store.location
+        if (
+            self.origin is None
+            or not SCROLL_MARGIN <= x - self.origin[0] < MAP_WIDTH - SCROLL_MARGIN
+            or not SCROLL_MARGIN <= y - self.origin[1] < MAP_HEIGHT - SCROLL_MARGIN
+        ):
+            self.origin = (x - MAP_WIDTH // 2, y - MAP_HEIGHT // 2)
+            tiles_changed = True
+
+        if tiles_changed:
+            left, top = self.origin
+            to_draw: typing.Iterable[tuple[int, int]] = (
+                (left + column, top + row)
+                for row in range(MAP_HEIGHT)
+                for column in range(MAP_WIDTH)
+            )
+        else:
+            to_draw = self._player_cells | store.players.keys()
+
+        for location in to_draw:
+            self._draw(store, location)
+        self._player_cells = set(store.players)
+
+    def _draw(self, store: ChunkStore, location: tuple[int, int]) -> None:
+        column, row = location[0] - self.origin[0], location[1] - self.origin[1]
+        if not (0 <= column < MAP_WIDTH and 0 <= row < MAP_HEIGHT):
+            return
+
+        players = store.players.get(location)
+        if players:
+            cell = OUR_PLAYER_CELL if self.main_app.uid in players else PLAYER_CELL
+        elif location in store.colors:
+            cell = tile_cell(store.colors[location])
+        else:
+            cell = EMPTY_CELL
+
+        self.grid.set(column, row, cell)
@@ -0,0 +1,131 @@
+"""Saving the chunks of the map to disk, so they don't need to be sent again next time.
+
+Chunks are kept by the hash of the map they're from. When the map changes so does the hash,
+and the chunks of the old map are thrown out eventually.
+
+Everything here waits on the disk, so it's never called from the event loop that draws the
+screen: it runs on the decoding thread (see `GameInterface.decode`) or with `asyncio.to_thread`.
+"""
+import json
+import os
+import shutil
+
+from common.schemas import MapChunk, MapUpdate
+
+CACHE_DIR = os.path.join(
+    os.path.expanduser("~"), ".cache", "curse-of-the-mites", "maps"
+)
+MAX_CACHED_MAPS = 3  # Only the chunks of the latest maps we played on are kept.
+
+
+class MapCache:
+    """The chunks saved for each map, as a JSON file per chunk in a folder for each map hash.
+
+    Saving is best effort: if something goes wrong the chunk is kept in memory instead, since
+    the server thinks we have it saved and won't send it again while we're connected. If a saved
+    chunk goes missing while playing, that bit of the map stays blank until we register again.
+    """
+
+    def __init__(self, directory: str = CACHE_DIR) -> None:
+        self.directory = directory
+        self.map_hash: str | None = None
+        # The chunks of the current map that couldn't be saved.
+        self._unsaved: dict[tuple[int, int], MapChunk] = {}
+
+    def latest(self) -> tuple[str | None, list[tuple[int, int]]]:
+        """The hash of the last map we played on and the chunks we saved of it."""
+        try:
+            map_hashes = self._map_hashes()
+            if not map_hashes:
+                return None, []
+
+            chunks = []
+            for file_name in os.listdir(os.path.join(self.directory, map_hashes[0])):
+                name, extension = os.path.splitext(file_name)
+                x, _, y = name.partition("_")
+                if extension == ".json":
+                    chunks.append((int(x), int(y)))
+        except (OSError, ValueError):
+            return None, []
+
+        return map_hashes[0], chunks
+
+    def use(self, map_hash: str) -> None:
+        """Starts saving chunks for the given map, and forgets about the oldest maps."""
+        if map_hash != self.map_hash:
+            self._unsaved.clear()
+        self.map_hash = map_hash
+        try:
+            os.makedirs(self._map_directory(), exist_ok=True)
+            os.utime(self._map_directory())  # Mark it as the latest.
+
+            for old_hash in self._map_hashes()[MAX_CACHED_MAPS:]:
+                shutil.rmtree(
+                    os.path.join(self.directory, old_hash), ignore_errors=True
+                )
+        except OSError:
+            pass
+
+    def fill(self, update: MapUpdate) -> None:
+        """Saves the chunks of an update, and loads the ones it says we have saved into it.
+
+        Afterwards all of the update's chunks are in `update.chunks`, so applying it doesn't
+        need the disk.
+        """
+        for chunk in update.chunks:
+            if not self.save(chunk):
+                self._unsaved[(chunk.x, chunk.y)] = chunk
+        for x, y in update.from_cache:
+            chunk = self.load(x, y)
+            if chunk is not None:
+                update.chunks.append(chunk)
+        update.from_cache = []
+
+    def save(self, chunk: MapChunk) -> bool:
+        """Saves a chunk to disk, returns False if it couldn't."""
+        if self.map_hash is None:
+            return False
+
+        path = self._chunk_path(chunk.x, chunk.y)
+        try:
+            # Write to a temporary file first, so we never leave half a chunk behind.
+            with open(f"{path}.tmp", "w") as file:
+                file.write(chunk.json())
+            os.replace(f"{path}.tmp", path)
+        except OSError:
+            return False
+
+        return True
+
+    def load(self, x: int, y: int) -> MapChunk | None:
+        unsaved = self._unsaved.get((x, y))
+        if unsaved is not None:
+            return unsaved
+        if self.map_hash is None:
+            return None
+
+        try:
+            with open(self._chunk_path(x, y)) as file:
+                return MapChunk(**json.load(file))
+        except (OSError, ValueError):
+            return None
+
+    def _map_hashes(self) -> list[str]:
+        """The hashes of the maps we have chunks of, the most recently played first."""
+        if not os.path.isdir(self.directory):
+            return []
+
+        return sorted(
+            os.listdir(self.directory),
+            key=lambda map_hash: os.path.getmtime(
+                os.path.join(self.directory, map_hash)
+            ),
+            reverse=True,
+        )
+
+    def _map_directory(self) -> str:
+        assert self.map_hash
+        return os.path.join(self.directory, self.map_hash)
+
+    def _chunk_path(self, x: int, y: int) -> str:
+        return os.path.join(self._map_directory(), f"{x}_{y}.json")
@@ -0,0 +1,30 @@
+"""Keeping the widgets from being redrawn after every single message.
+
+The server can send a lot of messages at once (every tick, or when a chat gets busy), and
+refreshing the widgets after each of them means redrawing the screen dozens of times for
+something nobody gets to see. Instead, widgets are marked as dirty and all of them are
+refreshed together, at most once per frame.
+"""
+from textual.app import App
+from textual.widget import Widget
+
+RENDER_FPS = 30  # How many times per second the screen can be redrawn, at most.
+
+
+class RenderScheduler:
+    def __init__(self, fps: int = RENDER_FPS) -> None:
+        self.fps = fps
+        self._dirty: set[Widget] = set()
+
+    def start(self, app: App) -> None:
+        """Starts refreshing the dirty widgets of the app every frame."""
+        app.set_interval(1 / self.fps, self.flush, name="render")
+
+    def mark(self, *widgets: Widget) -> None:
+        """Asks for the widgets to be redrawn on the next frame."""
+        self._dirty.update(widgets)
+
+    def flush(self) -> None:
+        dirty, self._dirty = self._dirty, set()
+        for widget in dirty:
+            widget.refresh()
@@ -1,5 +1,7 @@
 import asyncio
-from typing import Any
+import queue
+import threading
+from typing import Any, AsyncIterator, NamedTuple
 
 import websockets
 from rich.console import Console
@@ -7,6 +9,12 @@ from textual.app import App
 from textual.driver import Driver
 from websockets.legacy.client import WebSocketClientProtocol
 
+_CLOSED = object()  # Sent down the queues once the connection is gone.
+
+
+class _DecodingFailed(NamedTuple):
+    error: Exception
+
 
 class WebsocketApp(App):
     """A textual app meant to allow sending and receiving websocket messages."""
@@ -27,6 +35,52 @@ class WebsocketApp(App):
         """This method is meant to be overriden in order to handle receiving messages from a websocket."""
         await asyncio.Future()
 
+    def decode(self, message: str | bytes) -> Any:
+        """Turns a message from the websocket into what `events` gives back.
+
+        This runs on a separate thread, so it must not touch the widgets.
+        """
+        return message
+
+    async def events(self) -> AsyncIterator[Any]:
+        """The messages from the websocket, already decoded, in the order they arrived.
+
+        Decoding big messages takes a while, so it's done on a thread of its own instead of
+        the event loop that draws the screen and handles input.
+        """
+        loop = asyncio.get_running_loop()
+        frames: queue.SimpleQueue[Any] = queue.SimpleQueue()
+        decoded: asyncio.Queue[Any] = asyncio.Queue()
+
+        def decode_frames() -> None:
+            while (frame := frames.get()) is not _CLOSED:
+                try:
+                    event = self.decode(frame)
+                except Exception as error:
+                    event = _DecodingFailed(error)
+                loop.call_soon_threadsafe(decoded.put_nowait, event)
+            loop.call_soon_threadsafe(decoded.put_nowait, _CLOSED)
+
+        async def receive_frames() -> None:
+            try:
+                async for frame in self.websocket:
+                    frames.put(frame)
+            finally:
+                frames.put(_CLOSED)
+
+        threading.Thread(target=decode_frames, name="decoder", daemon=True).start()
+        receiver = asyncio.create_task(receive_frames())
+        try:
+            while (event := await decoded.get()) is not _CLOSED:
+                if isinstance(event, _DecodingFailed):
+                    raise event.error
+                yield event
+
+            await receiver  # Raises if the connection was closed because of an error.
+        finally:
+            receiver.cancel()
+            frames.put(_CLOSED)
+
     @classmethod
     def run(
         cls,
@@ -6,8 +6,10 @@ from .schemas import (
     ActionNoTargetRequest,
     ActionResponse,
     ActionWithTargetRequest,
+    ChatDigest,
     ChatMessage,
     InitializePlayer,
+    MapChunk,
     MapUpdate,
     PlayerSchema,
     RegistrationSuccessful,
@@ -22,10 +24,12 @@ __all__ = (
     "ActionNoTargetRequest",
     "ActionResponse",
     "ActionWithTargetRequest",
+    "ChatDigest",
     "ChatMessage",
     "InitializePlayer",
     "PlayerSchema",
     "RegistrationSuccessful",
+    "MapChunk",
     "MapUpdate",
     # serialization.py
     "deserialize_client_request",
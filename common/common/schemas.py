@@ -11,17 +11,34 @@ class MessageBase(BaseModel, Generic[Type]):
     type: Type
 
 
+ChatScope = Literal["room", "nearby", "global", "whisper"]
+
+
 class ChatMessage(MessageBase[Literal["chat"]]):
     """Sent by the client (or server) when they wish to chat with the rest of the server."""
 
     player_name: str
     chat_message: str
+    # Who gets to hear it: the current room, it and the rooms next to it, everyone or a single player.
+    scope: ChatScope = "global"
+    target: int | None = None  # The UID of the player being whispered to.
+
+
+class ChatDigest(MessageBase[Literal["chat_digest"]]):
+    """Sent by the server instead of single global chat messages when global chat gets busy."""
+
+    messages: list[ChatMessage]
+    skipped: int  # How many messages didn't make it into the digest.
 
 
 class InitializePlayer(MessageBase[Literal["init"]]):
     """Sent by the client when they want to initialize a player"""
 
     username: str
+    # The hash of the last map the client played on, and the chunks of it they have saved. If
+    # it's the map we're playing on, those chunks aren't sent again.
+    map_hash: str | None = None
+    cached_chunks: list[tuple[int, int]] = []
 
 
 class PlayerSchema(BaseModel):
@@ -32,17 +49,33 @@ class PlayerSchema(BaseModel):
     allowed_actions: set[str]
 
 
-class ExportedData(TypedDict):
-    uid: int
+class TileKind(TypedDict):
+    """What a kind of room on the map looks like, only with what doesn't change."""
+
+    title: str
+    description: str
     color: tuple[int, int, int]
     display_char: str
+    can_entity_step: bool
+
+
+class MapChunk(BaseModel):
+    """A square of the map, sent to the players that get close enough to see it."""
+
+    x: int  # Position of the chunk, not of a tile. See `MapUpdate.location`.
+    y: int
+    kinds: list[
+        TileKind
+    ]  # Most tiles look the same, so they're only sent once per chunk.
+    tiles: list[
+        tuple[int, int, int]
+    ]  # The x and y of each tile, and its index in `kinds`.
+
+
+class PlayerLocation(TypedDict):
+    uid: int
     x: int
     y: int
-    title: str
-    description: str
-    mobs: list
-    players: list
-    exits: list
 
 
 class RoomChangeUpdate(MessageBase[Literal["room_change"]]):
@@ -55,9 +88,19 @@ class RoomChangeUpdate(MessageBase[Literal["room_change"]]):
 
 
 class MapUpdate(MessageBase[Literal["map_update"]]):
-    """Sent by the server to update the client on the details of the map"""
+    """Sent by the server to update the client on the details of the map.
+
+    Only the chunks around the player are sent, and only once: the client keeps them until it's
+    told to forget them.
+    """
 
-    map: list[ExportedData]
+    location: tuple[int, int]  # Where the player is on the map.
+    chunks: list[MapChunk]  # Chunks that came into view.
+    from_cache: list[
+        tuple[int, int]
+    ] = []  # Chunks that came into view the client has saved.
+    forget: list[tuple[int, int]]  # Chunks that went out of view.
+    players: list[PlayerLocation]  # The players in view.
     entities: list[RoomChangeUpdate]
 
 
@@ -65,6 +108,7 @@ class RegistrationSuccessful(MessageBase[Literal["registration_successful"]]):
     """Sent by the server when the player successfully registers."""
 
     player: PlayerSchema
+    map_hash: str  # Changes when anything about the map (besides who's on it) does.
     map: MapUpdate
 
 
@@ -73,6 +117,7 @@ class ActionNoTargetRequest(MessageBase[Literal["action"]]):
 
     action: str
     player: int  # The player that's trying to perform the action.
+    seq: int | None = None  # Numbers the commands of a client, see `QueueUpdate`.
 
 
 class ActionWithTargetRequest(MessageBase[Literal["action"]]):
@@ -81,6 +126,7 @@ class ActionWithTargetRequest(MessageBase[Literal["action"]]):
     action: str
     target: int
     player: int  # The player that's trying to perform the action.
+    seq: int | None = None
 
 
 class MovementRequest(MessageBase[Literal["move"]]):
@@ -88,12 +134,36 @@ class MovementRequest(MessageBase[Literal["move"]]):
 
     direction: str
     player: int
+    seq: int | None = None
+
+
+class CommandBatch(MessageBase[Literal["batch"]]):
+    """Sent by the client to queue several commands in one go.
+
+    Either all of them make it into the queue, in order, or none of them do.
+    """
+
+    # Targeted actions go first, otherwise they'd be read as actions without a target.
+    commands: list[ActionWithTargetRequest | ActionNoTargetRequest | MovementRequest]
 
 
 class ActionResponse(MessageBase[Literal["action_response"]]):
     """Response to an action which the client sent."""
 
     response: str
+    seq: int | None = None  # The `seq` of the request this answers.
+    queue: list[
+        int
+    ] | None = None  # What's in the player's queue after it, see `QueueUpdate`.
+
+
+class BatchResponse(MessageBase[Literal["batch_response"]]):
+    """Response to a `CommandBatch`."""
+
+    applied: bool  # False if none of the commands were queued.
+    responses: list[str]  # What each command would have gotten as an `ActionResponse`.
+    seqs: list[int | None]  # The `seq` of each command.
+    queue: list[int] | None = None
 
 
 class ActionUpdateMessage(MessageBase[Literal["update"]]):
@@ -112,6 +182,19 @@ class MovementUpdateMessage(MessageBase[Literal["movement_update"]]):
     map_update: MapUpdate | None
 
 
+class QueueUpdate(MessageBase[Literal["queue_update"]]):
+    """Sent by the server after a tick where one of the player's queued commands ran.
+
+    Along with `ActionResponse`, this lets the client keep its own copy of the queue and show
+    commands as soon as they're typed, without waiting on the server.
+    """
+
+    done: int | None  # The `seq` of the command that ran.
+    queue: list[
+        int
+    ]  # The `seq` of each command still queued, the next one to run first.
+
+
 class RoomInformationMessage(MessageBase[Literal["room_info"]]):
     """Message sent to a player that's entering a new room."""
 
@@ -142,18 +225,22 @@ CLIENT_REQUEST = (
     | ActionNoTargetRequest
     | ActionWithTargetRequest
     | MovementRequest
+    | CommandBatch
 )
 
 SERVER_RESPONSE = (
     RegistrationSuccessful
     | LevelUpNotification
     | ActionResponse
+    | BatchResponse
     | ChatMessage
+    | ChatDigest
     | ActionUpdateMessage
     | RoomChangeUpdate
     | DEATH
     | WIN
     | MapUpdate
     | MovementUpdateMessage
+    | QueueUpdate
 )
 MESSAGE = CLIENT_REQUEST | SERVER_RESPONSE
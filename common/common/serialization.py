@@ -10,12 +10,16 @@ from .schemas import (
     ActionResponse,
     ActionUpdateMessage,
     ActionWithTargetRequest,
+    BatchResponse,
+    ChatDigest,
     ChatMessage,
+    CommandBatch,
     InitializePlayer,
     LevelUpNotification,
     MapUpdate,
     MovementRequest,
     MovementUpdateMessage,
+    QueueUpdate,
     RegistrationSuccessful,
     RoomChangeUpdate,
 )
@@ -35,6 +39,8 @@ def deserialize_client_request(event: dict[str, typing.Any]) -> CLIENT_REQUEST:
             return InitializePlayer(**event)
         case {"type": "move"}:
             return MovementRequest(**event)
+        case {"type": "batch"}:
+            return CommandBatch(**event)
         case _:
             raise NotImplementedError(f"unknown event type `{event['type']}`")
 
@@ -43,10 +49,14 @@ def deserialize_server_response(event: dict[str, typing.Any]) -> SERVER_RESPONSE
     match event:
         case {"type": "chat"}:
             return ChatMessage(**event)
+        case {"type": "chat_digest"}:
+            return ChatDigest(**event)
         case {"type": "registration_successful"}:
             return RegistrationSuccessful(**event)
         case {"type": "action_response"}:
             return ActionResponse(**event)
+        case {"type": "batch_response"}:
+            return BatchResponse(**event)
         case {"type": "map_update"}:
             return MapUpdate(**event)
         case {"type": "update"}:
@@ -61,6 +71,8 @@ def deserialize_server_response(event: dict[str, typing.Any]) -> SERVER_RESPONSE
             return LevelUpNotification(**event)
         case {"type": "movement_update"}:
             return MovementUpdateMessage(**event)
+        case {"type": "queue_update"}:
+            return QueueUpdate(**event)
         case _:
             raise NotImplementedError(f"unknown event type `{event['type']}`")
 
@@ -0,0 +1,115 @@
+"""Replays a journal with everyone connected over memory, to see how a build holds up.
+
+Usage: `python benchmark.py journals/<journal> [minimum ticks per second]`
+
+The ticks run back to back, with every update going through `send_updates` and the outbound
+queues like it would on the server. It fails if the world doesn't end up the same as when the
+journal was recorded, or if it's slower than the minimum given.
+"""
+import asyncio
+import sys
+import time
+import typing
+
+import main
+from journal import RecordKind
+from replay import ReplayDivergedError, apply_record, start_replay
+
+
+class MemoryConnection:
+    """Stands in for a player's websocket, counting what would've been sent to them."""
+
+    def __init__(self) -> None:
+        self.frames = 0
+        self.bytes_sent = 0
+
+    async def send(self, frame: str) -> None:
+        self.frames += 1
+        self.bytes_sent += len(frame.encode())
+
+    async def close(self, code: int = 1000, reason: str = "") -> None:
+        pass
+
+
+class BenchmarkResult(typing.NamedTuple):
+    ticks: int
+    seconds: float
+    events: int
+    frames: int
+    bytes_sent: int
+    slowest_tick: float  # In seconds.
+    checked_tick: int | None  # The last tick the world was checked against the journal.
+
+    def __str__(self) -> str:
+        ticks = max(self.ticks, 1)
+        checked = (
+            f"matches the journal at tick {self.checked_tick}"
+            if self.checked_tick is not None
+            else "wasn't checked, the journal has no checksums"
+        )
+        return (
+            f"{self.ticks} ticks in {self.seconds:.3f}s ({self.ticks / self.seconds:.1f} ticks/s)\n"
+            f"{self.events / ticks:.1f} events/tick, slowest tick took "
+            f"{self.slowest_tick * 1000:.2f}ms\n"
+            f"{self.frames} messages, {self.bytes_sent} bytes sent "
+            f"({self.bytes_sent / ticks:.0f} bytes/tick)\n"
+            f"The world {checked}"
+        )
+
+
+async def benchmark(path: str) -> BenchmarkResult:
+    game, records = start_replay(path)
+    start_tick = game.tick
+
+    connections: dict[int, MemoryConnection] = {}
+    events = 0
+    slowest_tick = 0.0
+    checked_tick = None
+
+    start = time.perf_counter()
+    for record in records:
+        record_start = time.perf_counter()
+        events += await apply_record(game, record)
+
+        match record.kind:
+            case RecordKind.CONNECT:
+                connections[record.uid] = MemoryConnection()
+                main.connections.add(record.uid, connections[record.uid])
+            case RecordKind.DISCONNECT:
+                main.connections.remove(record.uid)
+            case RecordKind.TICK:
+                slowest_tick = max(slowest_tick, time.perf_counter() - record_start)
+                # Let the writers send out what this tick queued up.
+                await asyncio.sleep(0)
+            case RecordKind.CHECKSUM:
+                checked_tick = record.tick
+
+    # Whoever is still around gets the rest of their messages.
+    for uid in connections:
+        main.connections.remove(uid)
+    await asyncio.sleep(0)
+    seconds = time.perf_counter() - start
+
+    return BenchmarkResult(
+        ticks=game.tick - start_tick,
+        seconds=seconds,
+        events=events,
+        frames=sum(connection.frames for connection in connections.values()),
+        bytes_sent=sum(connection.bytes_sent for connection in connections.values()),
+        slowest_tick=slowest_tick,
+        checked_tick=checked_tick,
+    )
+
+
+if __name__ == "__main__":
+    try:
+        result = asyncio.run(benchmark(sys.argv[1]))
+    except ReplayDivergedError as e:
+        print(f"The game doesn't play out like the journal anymore: {e}")
+        sys.exit(1)
+
+    print(result)
+
+    if len(sys.argv) > 2 and result.ticks / result.seconds < float(sys.argv[2]):
+        print(f"That's slower than {sys.argv[2]} ticks/s!")
+        sys.exit(1)
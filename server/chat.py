@@ -0,0 +1,76 @@
+"""Routes chat messages to the players that should hear them."""
+import asyncio
+import collections
+
+from connection_registry import ConnectionRegistry
+from game_components.game_objects import Player
+
+from common.schemas import ChatDigest, ChatMessage
+
+GLOBAL_CHAT_INTERVAL = 0.5  # Seconds between each time global chat is sent out.
+# If more global messages than this pile up, they're sent as a digest.
+MAX_GLOBAL_BURST = 5
+MAX_DIGEST_SIZE = 20  # Only the latest messages make it into a digest.
+
+
+class ChatRouter:
+    """Sends chat messages to their scope, encoding each message only once.
+
+    Room, nearby and whisper messages go out right away to the players that can hear them.
+    Global messages are held back and sent together every `GLOBAL_CHAT_INTERVAL` seconds, so
+    a busy global chat can't swamp the updates of each tick.
+    """
+
+    def __init__(self, connections: ConnectionRegistry) -> None:
+        self.connections = connections
+        self._global: collections.deque[ChatMessage] = collections.deque(
+            maxlen=MAX_DIGEST_SIZE
+        )
+        self._skipped = 0  # Global messages pushed out of the queue before being sent.
+
+    def route(self, message: ChatMessage, sender: Player) -> None:
+        # Don't trust the client with the name, someone might want to impersonate someone else.
+        message.player_name = sender.name
+
+        match message.scope:
+            case "room":
+                uids = sender.in_room.get_player_uids()
+            case "nearby":
+                uids = set(sender.in_room.get_player_uids())
+                for room in sender.in_room.get_links().values():
+                    if room is not None:
+                        uids.update(room.get_player_uids())
+            case "whisper" if message.target is not None:
+                # The sender gets it too, so they can see what they whispered.
+                uids = {sender.uid, message.target}
+            case "global":
+                if len(self._global) == self._global.maxlen:
+                    self._skipped += 1
+                self._global.append(message)
+                return
+            case _:
+                return  # Whispering to nobody.
+
+        self.connections.send_to(uids, message.json())
+
+    def flush(self) -> None:
+        """Sends out the global messages that piled up since the last flush."""
+        if not self._global:
+            return
+
+        if len(self._global) <= MAX_GLOBAL_BURST and not self._skipped:
+            for message in self._global:
+                self.connections.broadcast(message.json())
+        else:
+            digest = ChatDigest(
+                type="chat_digest", messages=list(self._global), skipped=self._skipped
+            )
+            self.connections.broadcast(digest.json())
+
+        self._global.clear()
+        self._skipped = 0
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(GLOBAL_CHAT_INTERVAL)
+            self.flush()
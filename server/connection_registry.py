@@ -0,0 +1,98 @@
+"""Keeps track of the connection of every player in the game."""
+import typing
+
+from outbound import (
+    OUTBOUND_QUEUE_SIZE,
+    SLOW_CONSUMER_POLICY,
+    OutboundQueue,
+    Priority,
+    SlowConsumerPolicy,
+)
+from websockets.legacy.server import WebSocketServerProtocol
+
+
+class AllExcept(typing.NamedTuple):
+    """Update target meaning "every connected player except this one"."""
+
+    uid: int
+
+
+class SetExcept(typing.NamedTuple):
+    """Update target meaning "these players except this one", without copying the set."""
+
+    uids: frozenset[int]
+    uid: int
+
+
+class ConnectionRegistry:
+    """Player UIDs mapped to the outbound queues of their connections.
+
+    Sending only ever puts an already encoded message in the queues, the writer task of each
+    connection takes care of the network. Server-wide announcements go over the live view of
+    all the queues, without building a new set of targets every time.
+    """
+
+    def __init__(
+        self,
+        queue_size: int = OUTBOUND_QUEUE_SIZE,
+        policy: SlowConsumerPolicy = SLOW_CONSUMER_POLICY,
+    ) -> None:
+        self.queue_size = queue_size
+        self.policy = policy
+        self._queues: dict[int, OutboundQueue] = {}
+
+    def __contains__(self, uid: int) -> bool:
+        return uid in self._queues
+
+    def __len__(self) -> int:
+        return len(self._queues)
+
+    def add(self, uid: int, connection: WebSocketServerProtocol) -> None:
+        queue = OutboundQueue(connection, self.queue_size, self.policy)
+        queue.start()
+        self._queues[uid] = queue
+
+    def remove(self, uid: int) -> None:
+        """Forgets about a player's connection, once whatever was queued for them is sent."""
+        queue = self._queues.pop(uid, None)
+        if queue is not None:
+            queue.close()
+
+    def get(self, uid: int) -> OutboundQueue | None:
+        return self._queues.get(uid)
+
+    def send(self, uid: int, frame: str, priority: Priority = Priority.HIGH) -> None:
+        """Sends a message to a single player, if they're still connected."""
+        queue = self._queues.get(uid)
+        if queue is not None:
+            queue.push(frame, priority)
+
+    def send_to(
+        self,
+        uids: typing.Iterable[int],
+        frame: str,
+        priority: Priority = Priority.LOW,
+        exclude: int | None = None,
+    ) -> None:
+        """Sends a message to the given players that are still connected, but `exclude`."""
+        queues = self._queues
+        for uid in uids:
+            if uid == exclude:
+                continue
+            queue = queues.get(uid)
+            if queue is not None:
+                queue.push(frame, priority)
+
+    def broadcast(self, frame: str, priority: Priority = Priority.LOW) -> None:
+        """Sends a message to every connected player."""
+        for queue in self._queues.values():
+            queue.push(frame, priority)
+
+    def broadcast_except(
+        self, uid: int, frame: str, priority: Priority = Priority.LOW
+    ) -> None:
+        """Sends a message to every connected player except the given one."""
+        excluded = self._queues.get(uid)
+        for queue in self._queues.values():
+            if queue is not excluded:
+                queue.push(frame, priority)
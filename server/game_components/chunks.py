@@ -0,0 +1,122 @@
+"""Splitting the map into chunks, so players only get the part of the map they can see."""
+from __future__ import annotations
+
+import typing
+
+from common.schemas import MapChunk, MapUpdate, PlayerLocation, TileKind
+
+if typing.TYPE_CHECKING:
+    from game_objects import BaseRoom, Player
+
+CHUNK_SIZE = 16  # Width and height of a chunk, in tiles.
+# How many chunks around the player's they get to see. With 1, the client sees 48x48 tiles
+# around them, which is more than their map can show.
+VIEW_RADIUS = 1
+
+Chunk = tuple[int, int]
+
+
+def chunk_of(x: int, y: int) -> Chunk:
+    return x // CHUNK_SIZE, y // CHUNK_SIZE
+
+
+class ChunkMap:
+    """The rooms and players of the map by chunk, and what each player already knows about them.
+
+    How much is sent to a player only depends on `VIEW_RADIUS`, not on how big the map (or how
+    many players there are in it) is. The game has to tell it whenever a player shows up, moves
+    or leaves, to keep track of the players.
+    """
+
+    def __init__(self, radius: int = VIEW_RADIUS) -> None:
+        self.radius = radius
+        self._rooms: dict[Chunk, list[BaseRoom]] = {}
+        self._exported: dict[
+            Chunk, MapChunk
+        ] = {}  # The rooms don't change, neither do these.
+        self._players: dict[Chunk, dict[int, Player]] = {}
+
+    def add_room(self, room: BaseRoom) -> None:
+        chunk = chunk_of(*room.get_map_location())
+        self._rooms.setdefault(chunk, []).append(room)
+        self._exported.pop(chunk, None)
+
+    def add_player(self, player: Player) -> None:
+        chunk = chunk_of(*player.in_room.get_map_location())
+        self._players.setdefault(chunk, {})[player.uid] = player
+
+    def remove_player(self, player: Player, room: BaseRoom) -> None:
+        """Forgets about a player that was in the given room."""
+        chunk = chunk_of(*room.get_map_location())
+        players = self._players.get(chunk)
+        if players is not None:
+            players.pop(player.uid, None)
+            if not players:
+                del self._players[chunk]
+
+    def move_player(self, player: Player, from_room: BaseRoom) -> None:
+        if chunk_of(*from_room.get_map_location()) != chunk_of(
+            *player.in_room.get_map_location()
+        ):
+            self.remove_player(player, from_room)
+            self.add_player(player)
+
+    def export(self, chunk: Chunk) -> MapChunk:
+        exported = self._exported.get(chunk)
+        if exported is None:
+            kinds: dict[
+                tuple, int
+            ] = {}  # Index of each kind of tile in `MapChunk.kinds`.
+            exported_kinds: list[TileKind] = []
+            tiles = []
+            for room in self._rooms[chunk]:
+                kind = room.export_kind()
+                key = tuple(kind.values())
+                if key not in kinds:
+                    kinds[key] = len(exported_kinds)
+                    exported_kinds.append(kind)
+                tiles.append((room.display_x, room.display_y, kinds[key]))
+
+            exported = self._exported[chunk] = MapChunk(
+                x=chunk[0], y=chunk[1], kinds=exported_kinds, tiles=tiles
+            )
+        return exported
+
+    def visible_from(self, x: int, y: int) -> set[Chunk]:
+        """The chunks (that have something in them) a player at the given location can see."""
+        chunk_x, chunk_y = chunk_of(x, y)
+        return {
+            (chunk_x + dx, chunk_y + dy)
+            for dx in range(-self.radius, self.radius + 1)
+            for dy in range(-self.radius, self.radius + 1)
+            if (chunk_x + dx, chunk_y + dy) in self._rooms
+        }
+
+    def map_update(self, player: Player) -> MapUpdate:
+        """What the player needs to know about the map around them, since their last update."""
+        location = player.in_room.get_map_location()
+        visible = self.visible_from(*location)
+
+        appeared = visible - player.known_chunks
+        from_cache = appeared & player.cached_chunks
+        new_chunks = [self.export(chunk) for chunk in appeared - from_cache]
+        forget = list(player.known_chunks - visible)
+        player.known_chunks = visible
+        # The client keeps every chunk it gets, on disk or in memory (see `MapCache`).
+        player.cached_chunks |= appeared
+
+        in_view: list[PlayerLocation] = []
+        for chunk in visible:
+            for other in self._players.get(chunk, {}).values():
+                x, y = other.in_room.get_map_location()
+                in_view.append({"uid": other.uid, "x": x, "y": y})
+
+        return MapUpdate(
+            type="map_update",
+            location=location,
+            chunks=new_chunks,
+            from_cache=list(from_cache),
+            forget=forget,
+            players=in_view,
+            entities=player._create_room_change_update_list(),
+        )
@@ -0,0 +1,90 @@
+"""Keeps track of the fights going on around the map."""
+from __future__ import annotations
+
+import typing
+
+if typing.TYPE_CHECKING:
+    from game import Game
+    from game_objects import BaseRoom, Mob, Player
+
+
+class CombatManager:
+    """Indexes the rooms that have a fight going on.
+
+    Only those rooms do combat work on each tick: mobs taking their turns, players fleeing and
+    fights ending. Everything that joins or leaves a fight should go through here so the index
+    (and the combatants mobs pick their targets from) stays up to date.
+    """
+
+    def __init__(self, game: Game) -> None:
+        self.game = game
+        self.rooms: dict[int, BaseRoom] = {}
+        # Room uid to the players fighting in it, as a sequence mobs can pick targets from.
+        self._targets: dict[int, tuple[int, ...]] = {}
+
+    def start_combat(self, room: BaseRoom, player: Player, mob: Mob) -> None:
+        """Makes a player and a mob fight each other."""
+        if player.uid not in room.player_combatants:
+            room.player_combatants.add(player.uid)
+            self._targets.pop(room.uid, None)
+
+        room.mob_combatants.add(mob.uid)
+        player.in_combat = True
+        mob.in_combat = True
+        self.rooms[room.uid] = room
+
+    def leave_combat(self, entity: Mob | Player) -> None:
+        """Takes an entity out of the fight in its room, if it was in one."""
+        room = entity.in_room
+        entity.in_combat = False
+
+        if entity.uid in room.player_combatants:
+            room.player_combatants.remove(entity.uid)
+            self._targets.pop(room.uid, None)
+        else:
+            room.mob_combatants.discard(entity.uid)
+
+    def take_mob_turns(self) -> None:
+        """Lets every mob that's in a fight act."""
+        finished = []
+        for room in self.rooms.values():
+            if len(room.player_combatants) == 0:
+                # There are no players left to fight, so stop fighting.
+                for mob_uid in room.mob_combatants:
+                    mob = self.game.get_mob(mob_uid)
+                    if mob is not None:
+                        mob.in_combat = False
+                room.mob_combatants.clear()
+                finished.append(room)
+                continue
+
+            targets = self._get_targets(room)
+            for mob_uid in room.mob_combatants:
+                mob = self.game.get_mob(mob_uid)
+                if mob is not None and mob.alive:
+                    mob.act_in_combat(targets)
+
+        for room in finished:
+            self._end_combat(room)
+
+    def end_finished_combats(self) -> None:
+        """Ends combat automatically in the rooms where there's no mobs left that want to fight."""
+        finished = [room for room in self.rooms.values() if not room.mob_combatants]
+
+        for room in finished:
+            for player_uid in room.player_combatants:
+                player = self.game.get_player(player_uid)
+                if player is not None:
+                    player.in_combat = False
+            room.player_combatants.clear()
+            self._end_combat(room)
+
+    def _get_targets(self, room: BaseRoom) -> tuple[int, ...]:
+        targets = self._targets.get(room.uid)
+        if targets is None:
+            targets = self._targets[room.uid] = tuple(room.player_combatants)
+        return targets
+
+    def _end_combat(self, room: BaseRoom) -> None:
+        del self.rooms[room.uid]
+        self._targets.pop(room.uid, None)
@@ -1,10 +1,13 @@
+import os
 import random
 import time
 from asyncio import Queue
 
-from common.schemas import WIN, LevelUpNotification, RoomChangeUpdate
+from common.schemas import WIN, LevelUpNotification, QueueUpdate, RoomChangeUpdate
 
 if __name__ == "__main__":
+    from chunks import CHUNK_SIZE, ChunkMap
+    from combat import CombatManager
     from game_objects import (
         ActionDict,
         BaseRoom,
@@ -22,9 +25,13 @@ if __name__ == "__main__":
         SpidersDen,
         TopOfLeaf,
         Wall,
-        raw_map,
     )
+    from map_format import GameMap
+    from respawn import Respawner, SpawnPoint
+    from snapshot import WorldSnapshot, restore_snapshot
 else:
+    from game_components.chunks import CHUNK_SIZE, ChunkMap
+    from game_components.combat import CombatManager
     from game_components.game_objects import (
         ActionDict,
         BaseRoom,
@@ -42,8 +49,10 @@ else:
         SpidersDen,
         TopOfLeaf,
         Wall,
-        raw_map,
     )
+    from game_components.map_format import GameMap
+    from game_components.respawn import Respawner, SpawnPoint
+    from game_components.snapshot import WorldSnapshot, restore_snapshot
 
 ROOMS_MAP = {
     "rs": RoughSide,
@@ -57,6 +66,9 @@ ROOMS_MAP = {
 }
 
 
+MAP_PATH = os.path.join(os.path.dirname(__file__), "maps", "world.map")
+
+
 class InvalidRoomError(Exception):
     pass
 
@@ -69,6 +81,7 @@ OUT_QUEUE = (
     | FleeDict
     | RoomChangeUpdate
     | LevelUpNotification
+    | QueueUpdate
     | WIN
     | int
 )
@@ -78,24 +91,47 @@ class Game:
     players: dict[int, Player]
     mobs: dict[int, Mob]
     rooms: dict[int, BaseRoom]
+    locations: dict[tuple[int, int], BaseRoom]  # The rooms by their place on the map.
+    spawn: tuple[int, int]  # Where new players show up.
+    map_hash: str  # Hash of everything clients get to see of the map, besides who's on it.
     start_time: int
-
-    def __init__(self):
+    tick: int  # How many ticks have gone by.
+
+    # Entities that died this tick, so cleaning up doesn't need to look at everyone.
+    dead_mobs: set[int]
+    dead_players: set[int]
+
+    def __init__(
+        self,
+        snapshot: WorldSnapshot | None = None,
+        map_path: str = MAP_PATH,
+        seed: int | None = None,
+    ):
+        # Everything random in the game comes from here, not from the `random` module, which
+        # other libraries (like websockets) draw from too.
+        self.rng = random.Random(seed)
         self.out_queue: Queue[OUT_QUEUE] = Queue()
         self.players = {}
         self.mobs = {}
         self.rooms = {}
-        self.build_map()
-        self.spawn_mobs()
+        self.locations = {}
+        self.chunks = ChunkMap()
+        # Players restored from a snapshot, waiting for someone with their name to come back.
+        self.sleeping_players: dict[str, list[Player]] = {}
+        self.dead_mobs = set()
+        self.dead_players = set()
+        self.tick = 0
+        self.respawner = Respawner()
+        self.combat = CombatManager(self)
+        self.build_map(map_path)
+        if snapshot is not None:
+            restore_snapshot(self, snapshot)
+        else:
+            self.spawn_mobs()
         self.start_time = round(time.time() * 1000)
 
     def get_room_at(self, x: int, y: int) -> BaseRoom | None:
-        temp = None
-        for room in self.rooms.values():
-            if room.get_map_location() == (x, y):
-                temp = room
-                break
-        return temp
+        return self.locations.get((x, y))
 
     def get_room(self, _uid: int) -> BaseRoom | None:
         return self.rooms.get(_uid)
@@ -107,91 +143,113 @@ class Game:
         return self.mobs.get(_uid)
 
     def spawn_mobs(self) -> None:
+        spawn_x, spawn_y = self.spawn
 
         for room in self.rooms.values():
-            if room.get_map_location() == (15, 24):
+            if room.get_map_location() == self.spawn:
                 # this is spawn location for player. Dont add a mob here
                 continue
-            if room.get_map_location() == (15, 23):
+            x, y = room.get_map_location()
+            if (x, y) == (spawn_x, spawn_y - 1):
                 # this is one north of spawn. This lets a player see a mob right away
                 # but its WEAK. This lets a player learn the game in a safe environment
                 # this acts as a tutorial without being EA handhold-y
-                m = Mob("Mite", ["annoy"], self)
-                self.add_mob(m, room.display_x, room.display_y)
+                self.spawn_mob({"x": x, "y": y, "name": "Mite", "actions": ["annoy"]})
                 continue
             if isinstance(room, Wall):
                 continue
             if isinstance(room, SpidersDen):
                 # Sting will be difficult, the also dont have annoy, so they are going to hit hard
-                m = Mob("Spider", ["sting", "eat_berry", "nibble"], self)
-                self.add_mob(m, room.display_x, room.display_y)
+                self.spawn_mob(
+                    {
+                        "x": x,
+                        "y": y,
+                        "name": "Spider",
+                        "actions": ["sting", "eat_berry", "nibble"],
+                    }
+                )
                 continue
-            chance_to_spawn = random.randint(0, 100)
+            chance_to_spawn = self.rng.randint(0, 100)
 
             # if there are too many mobs, make this magic number lower
             if chance_to_spawn < 25:
-                m = Mob("Mite", ["nibble", "eat_berry", "stomp", "annoy"], self)
-                self.add_mob(m, room.display_x, room.display_y)
+                self.spawn_mob(
+                    {
+                        "x": x,
+                        "y": y,
+                        "name": "Mite",
+                        "actions": ["nibble", "eat_berry", "stomp", "annoy"],
+                    }
+                )
 
-    def build_map(self) -> None:
-        largest_x = 0
-        largest_y = 0
-        for room_data in raw_map:
-            try:
-                temp = ROOMS_MAP[room_data["type"]](
-                    _display_x=room_data["x"], _display_y=room_data["y"]
+    def spawn_mob(self, spawn_point: SpawnPoint) -> Mob:
+        """Spawns a mob and remembers where it came from, so it can be respawned once it dies."""
+        mob = Mob(spawn_point["name"], spawn_point["actions"], self)
+        mob.spawn_point = spawn_point
+        self.add_mob(mob, spawn_point["x"], spawn_point["y"])
+        return mob
+
+    def respawn_mobs(self) -> None:
+        """Brings back the mobs whose respawn timer ran out."""
+        for spawn_point in self.respawner.due(self.tick):
+            mob = self.spawn_mob(spawn_point)
+            # Let anyone that's around know something crawled in.
+            mob.in_room.events.append(
+                RoomChangeUpdate(
+                    type="room_change",
+                    room_uid=mob.in_room.uid,
+                    entity_uid=mob.uid,
+                    entity_name=mob.name,
+                    enters=True,
                 )
-            except KeyError:
-                raise InvalidRoomError(f"Unknown room type {room_data['type']}")
-
-            if room_data["x"] > largest_x:
-                largest_x = room_data["x"]
-            if room_data["y"] > largest_y:
-                largest_y = room_data["y"]
-
-            self.rooms[temp.uid] = temp
-
-        for y in range(largest_y + 1):
-            for x in range(largest_x + 1):
-                current_room = None
-                for room in self.rooms.values():
-                    if room.get_map_location() == (x, y):
-                        current_room = room
-                        break
-                if current_room is not None:
-                    directions: dict[str, None | BaseRoom] = {
-                        "north": None,
-                        "east": None,
-                        "south": None,
-                        "west": None,
-                    }
+            )
+
+    def build_map(self, map_path: str) -> None:
+        with GameMap(map_path) as game_map:
+            try:
+                room_types = [ROOMS_MAP[name] for name in game_map.tile_types]
+            except KeyError as e:
+                raise InvalidRoomError(f"Unknown room type {e.args[0]}")
+
+            self.spawn = game_map.spawn
+            digest = game_map.digest()
+            kinds = {}  # How each type of tile looks, that's also sent to the clients.
+            for x, y, tile_type in game_map.tiles():
+                temp = room_types[tile_type](_display_x=x, _display_y=y)
+                if tile_type not in kinds:
+                    kinds[tile_type] = temp.export_kind()
+
+                self.rooms[temp.uid] = temp
+                self.locations[(x, y)] = temp
+                self.chunks.add_room(temp)
+
+            digest.update(repr((CHUNK_SIZE, sorted(kinds.items()))).encode())
+            self.map_hash = digest.hexdigest()
+
+        for (x, y), room in self.locations.items():
+            room.set_links(
+                {
+                    "north": self.locations.get((x, y - 1)),
+                    "east": self.locations.get((x + 1, y)),
+                    "south": self.locations.get((x, y + 1)),
+                    "west": self.locations.get((x - 1, y)),
+                }
+            )
+
+    def wake_player(self, name: str) -> Player | None:
+        """Puts a player restored from a snapshot back in the game, if there's one with this name."""
+        sleeping = self.sleeping_players.get(name)
+        if not sleeping:
+            return None
 
-                    for room in self.rooms.values():
-                        if room.get_map_location() == (
-                            current_room.display_x,
-                            current_room.display_y - 1,
-                        ):
-                            directions["north"] = room
-                            continue
-                        if room.get_map_location() == (
-                            current_room.display_x,
-                            current_room.display_y + 1,
-                        ):
-                            directions["south"] = room
-                            continue
-                        if room.get_map_location() == (
-                            current_room.display_x - 1,
-                            current_room.display_y,
-                        ):
-                            directions["west"] = room
-                            continue
-                        if room.get_map_location() == (
-                            current_room.display_x + 1,
-                            current_room.display_y,
-                        ):
-                            directions["east"] = room
-                            continue
-                    current_room.set_links(directions)
+        player = sleeping.pop()
+        if not sleeping:
+            del self.sleeping_players[name]
+
+        self.players[player.uid] = player
+        player.in_room.add_player(player)
+        self.chunks.add_player(player)
+        return player
 
     def add_player(self, player: Player, target_x: int, target_y: int) -> bool:
         room = self.get_room_at(target_x, target_y)
@@ -204,6 +262,7 @@ class Game:
             self.players[player.uid] = player
 
         room.add_player(player)
+        self.chunks.add_player(player)
         return True
 
     def move_player(self, player: Player, direction: str) -> bool:
@@ -218,6 +277,7 @@ class Game:
         if to_go is not None and to_go.can_entity_step:
             from_room.remove_player(player)
             to_go.add_player(player)
+            self.chunks.move_player(player, from_room)
             player_moved = True
 
         return player_moved
@@ -233,13 +293,20 @@ class Game:
 
     async def update(self):
         """One tick of the game!"""
+        self.tick += 1
+        self.respawn_mobs()
+
         # Update mobs.
         for mob_uid in self.mobs:
             self.mobs[mob_uid].update()
 
+        # Only the rooms with a fight going on do any combat work.
+        self.combat.take_mob_turns()
+
         # Update players.
         for player_uid in self.players:
             player = self.players[player_uid]
+            next_command = player.command_queue[-1] if player.command_queue else None
             action_performed = player.update()
 
             if player.won:
@@ -271,6 +338,19 @@ class Game:
                 case _:
                     await self.out_queue.put({"no_action": action_performed})
 
+            if next_command is not None:
+                queue_update = {
+                    "type": QueueUpdate(
+                        type="queue_update",
+                        done=next_command["seq"],
+                        queue=player.queued_seqs(),
+                    ),
+                    "uid": player_uid,
+                }
+                await self.out_queue.put(queue_update)
+
+        self.combat.end_finished_combats()
+
         # Handle events in rooms.
         for room_uid in self.rooms:
             for event in self.rooms[room_uid].events:
@@ -281,40 +361,47 @@ class Game:
                 []
             )  # If an event was missed for whatever reason... to bad... it's a feature!
 
+    def register_death(self, entity: Mob | Player) -> None:
+        """Marks an entity as dead so it gets removed the next time we clean the dead.
+
+        Called when an entity's health runs out, when a player wins and when a player disconnects.
+        """
+        entity.alive = False
+        if isinstance(entity, Player):
+            self.dead_players.add(entity.uid)
+        else:
+            self.dead_mobs.add(entity.uid)
+
     def clean_the_dead(self) -> list[int]:
         ## First the mobs.
-        mobs_to_pop = []
-        for mob_uid in self.mobs:
-            mob = self.mobs[mob_uid]
-
-            if not mob.alive:
-                room = mob.in_room
+        for mob_uid in self.dead_mobs:
+            mob = self.mobs.pop(mob_uid, None)
+            if mob is None:
+                continue
 
-                if mob_uid in room.mob_combatants:
-                    room.mob_combatants.remove(mob_uid)
+            room = mob.in_room
+            self.combat.leave_combat(mob)
+            room.remove_mob(mob)
 
-                room.remove_mob(mob)
-                mobs_to_pop.append(mob_uid)
+            if mob.spawn_point is not None:
+                self.respawner.mob_died(mob.spawn_point, self.tick)
 
-        for mob_uid in mobs_to_pop:
-            self.mobs.pop(mob_uid)
+        self.dead_mobs.clear()
 
         ## Then the players.
         players_to_pop = []
-        for player_uid in self.players:
-            player = self.players[player_uid]
-
-            if not player.alive:
-                room = player.in_room
-
-                if player_uid in room.player_combatants:
-                    room.player_combatants.remove(player_uid)
+        for player_uid in self.dead_players:
+            player = self.players.pop(player_uid, None)
+            if player is None:
+                continue
 
-                room.remove_player(player)
-                players_to_pop.append(player_uid)
+            room = player.in_room
+            self.combat.leave_combat(player)
+            room.remove_player(player)
+            self.chunks.remove_player(player, room)
+            players_to_pop.append(player_uid)
 
-        for player_uid in players_to_pop:
-            self.players.pop(player_uid)
+        self.dead_players.clear()
 
         return players_to_pop  # Their connections will need to be deleted.
 
@@ -330,13 +417,13 @@ if __name__ == "__main__":
     temp.add_player(A)
 
     # adding a mob
-    a = Mob("anta", ["bite"])
+    a = Mob("anta", ["bite"], g)
     temp = g.get_room_at(1, 1)
     assert temp, "no room at (1, 1)"
     temp.add_mob(a)
 
     # adding a mob to a map location
-    b = Mob("antb", ["bite"])
+    b = Mob("antb", ["bite"], g)
     g.add_mob(b, 1, 1)
 
     """
@@ -1,328 +1,37 @@
 from __future__ import annotations
 
+import array
 import hashlib
-import random
-import time
+import sys
+import types
 import typing
 from abc import ABC, abstractmethod  # abstract classes
 
-from common.schemas import MapUpdate, RoomChangeUpdate
+from common.schemas import MapUpdate, RoomChangeUpdate, TileKind
 
 if typing.TYPE_CHECKING:
+    from chunks import Chunk
     from game import Game
-
-raw_map: list[Tile] = [
-    {"y": 1, "x": 14, "type": "wall"},
-    {"y": 1, "x": 15, "type": "wall"},
-    {"y": 1, "x": 16, "type": "wall"},
-    {"y": 2, "x": 14, "type": "wall"},
-    {"y": 2, "x": 15, "type": "sd"},
-    {"y": 2, "x": 16, "type": "wall"},
-    {"y": 3, "x": 14, "type": "wall"},
-    {"y": 3, "x": 15, "type": "tol"},
-    {"y": 3, "x": 16, "type": "wall"},
-    {"y": 3, "x": 17, "type": "wall"},
-    {"y": 4, "x": 14, "type": "wall"},
-    {"y": 4, "x": 15, "type": "tol"},
-    {"y": 4, "x": 16, "type": "rs"},
-    {"y": 4, "x": 17, "type": "wall"},
-    {"y": 5, "x": 14, "type": "wall"},
-    {"y": 5, "x": 15, "type": "tol"},
-    {"y": 5, "x": 16, "type": "rs"},
-    {"y": 5, "x": 17, "type": "wall"},
-    {"y": 6, "x": 14, "type": "wall"},
-    {"y": 6, "x": 15, "type": "tol"},
-    {"y": 6, "x": 16, "type": "rs"},
-    {"y": 6, "x": 17, "type": "wall"},
-    {"y": 7, "x": 14, "type": "wall"},
-    {"y": 7, "x": 15, "type": "tol"},
-    {"y": 7, "x": 16, "type": "rs"},
-    {"y": 7, "x": 17, "type": "wall"},
-    {"y": 7, "x": 19, "type": "wall"},
-    {"y": 7, "x": 20, "type": "wall"},
-    {"y": 7, "x": 21, "type": "wall"},
-    {"y": 7, "x": 22, "type": "wall"},
-    {"y": 7, "x": 23, "type": "wall"},
-    {"y": 7, "x": 24, "type": "wall"},
-    {"y": 7, "x": 25, "type": "wall"},
-    {"y": 8, "x": 14, "type": "wall"},
-    {"y": 8, "x": 15, "type": "tol"},
-    {"y": 8, "x": 16, "type": "rs"},
-    {"y": 8, "x": 17, "type": "wall"},
-    {"y": 8, "x": 19, "type": "wall"},
-    {"y": 8, "x": 20, "type": "rt"},
-    {"y": 8, "x": 21, "type": "rt"},
-    {"y": 8, "x": 22, "type": "rt"},
-    {"y": 8, "x": 23, "type": "rt"},
-    {"y": 8, "x": 24, "type": "rt"},
-    {"y": 8, "x": 25, "type": "rt"},
-    {"y": 8, "x": 26, "type": "wall"},
-    {"y": 8, "x": 27, "type": "wall"},
-    {"y": 8, "x": 28, "type": "wall"},
-    {"y": 9, "x": 2, "type": "wall"},
-    {"y": 9, "x": 3, "type": "wall"},
-    {"y": 9, "x": 4, "type": "wall"},
-    {"y": 9, "x": 5, "type": "wall"},
-    {"y": 9, "x": 6, "type": "wall"},
-    {"y": 9, "x": 7, "type": "wall"},
-    {"y": 9, "x": 8, "type": "wall"},
-    {"y": 9, "x": 9, "type": "wall"},
-    {"y": 9, "x": 10, "type": "wall"},
-    {"y": 9, "x": 11, "type": "wall"},
-    {"y": 9, "x": 12, "type": "wall"},
-    {"y": 9, "x": 14, "type": "wall"},
-    {"y": 9, "x": 15, "type": "tol"},
-    {"y": 9, "x": 16, "type": "rs"},
-    {"y": 9, "x": 17, "type": "wall"},
-    {"y": 9, "x": 18, "type": "wall"},
-    {"y": 9, "x": 19, "type": "wall"},
-    {"y": 9, "x": 20, "type": "tol"},
-    {"y": 9, "x": 21, "type": "tol"},
-    {"y": 9, "x": 22, "type": "tol"},
-    {"y": 9, "x": 23, "type": "tol"},
-    {"y": 9, "x": 24, "type": "tol"},
-    {"y": 9, "x": 25, "type": "tol"},
-    {"y": 9, "x": 26, "type": "tol"},
-    {"y": 9, "x": 27, "type": "tol"},
-    {"y": 9, "x": 28, "type": "wall"},
-    {"y": 10, "x": 2, "type": "wall"},
-    {"y": 10, "x": 3, "type": "sd"},
-    {"y": 10, "x": 4, "type": "tol"},
-    {"y": 10, "x": 5, "type": "tol"},
-    {"y": 10, "x": 6, "type": "tol"},
-    {"y": 10, "x": 7, "type": "tol"},
-    {"y": 10, "x": 8, "type": "tol"},
-    {"y": 10, "x": 9, "type": "tol"},
-    {"y": 10, "x": 10, "type": "tol"},
-    {"y": 10, "x": 11, "type": "tol"},
-    {"y": 10, "x": 12, "type": "wall"},
-    {"y": 10, "x": 13, "type": "wall"},
-    {"y": 10, "x": 14, "type": "wall"},
-    {"y": 10, "x": 15, "type": "tol"},
-    {"y": 10, "x": 16, "type": "rs"},
-    {"y": 10, "x": 17, "type": "wall"},
-    {"y": 10, "x": 18, "type": "rt"},
-    {"y": 10, "x": 19, "type": "tol"},
-    {"y": 10, "x": 20, "type": "tol"},
-    {"y": 10, "x": 21, "type": "wall"},
-    {"y": 10, "x": 22, "type": "wall"},
-    {"y": 10, "x": 23, "type": "wall"},
-    {"y": 10, "x": 24, "type": "wall"},
-    {"y": 10, "x": 25, "type": "wall"},
-    {"y": 10, "x": 26, "type": "wall"},
-    {"y": 10, "x": 27, "type": "sd"},
-    {"y": 10, "x": 28, "type": "wall"},
-    {"y": 11, "x": 2, "type": "wall"},
-    {"y": 11, "x": 3, "type": "wall"},
-    {"y": 11, "x": 4, "type": "wall"},
-    {"y": 11, "x": 5, "type": "wall"},
-    {"y": 11, "x": 6, "type": "wall"},
-    {"y": 11, "x": 7, "type": "wall"},
-    {"y": 11, "x": 8, "type": "wall"},
-    {"y": 11, "x": 9, "type": "lt"},
-    {"y": 11, "x": 10, "type": "lt"},
-    {"y": 11, "x": 11, "type": "tol"},
-    {"y": 11, "x": 12, "type": "tol"},
-    {"y": 11, "x": 13, "type": "tol"},
-    {"y": 11, "x": 14, "type": "wall"},
-    {"y": 11, "x": 15, "type": "tol"},
-    {"y": 11, "x": 16, "type": "rs"},
-    {"y": 11, "x": 17, "type": "wall"},
-    {"y": 11, "x": 18, "type": "tol"},
-    {"y": 11, "x": 19, "type": "tol"},
-    {"y": 11, "x": 20, "type": "wall"},
-    {"y": 11, "x": 21, "type": "wall"},
-    {"y": 11, "x": 26, "type": "wall"},
-    {"y": 11, "x": 27, "type": "wall"},
-    {"y": 11, "x": 28, "type": "wall"},
-    {"y": 12, "x": 8, "type": "wall"},
-    {"y": 12, "x": 9, "type": "wall"},
-    {"y": 12, "x": 10, "type": "wall"},
-    {"y": 12, "x": 11, "type": "wall"},
-    {"y": 12, "x": 12, "type": "wall"},
-    {"y": 12, "x": 13, "type": "tol"},
-    {"y": 12, "x": 14, "type": "tol"},
-    {"y": 12, "x": 15, "type": "tol"},
-    {"y": 12, "x": 16, "type": "rs"},
-    {"y": 12, "x": 17, "type": "tol"},
-    {"y": 12, "x": 18, "type": "tol"},
-    {"y": 12, "x": 19, "type": "wall"},
-    {"y": 12, "x": 20, "type": "wall"},
-    {"y": 13, "x": 12, "type": "wall"},
-    {"y": 13, "x": 13, "type": "wall"},
-    {"y": 13, "x": 14, "type": "lt"},
-    {"y": 13, "x": 15, "type": "tol"},
-    {"y": 13, "x": 16, "type": "rs"},
-    {"y": 13, "x": 17, "type": "tol"},
-    {"y": 13, "x": 18, "type": "wall"},
-    {"y": 13, "x": 19, "type": "wall"},
-    {"y": 14, "x": 13, "type": "wall"},
-    {"y": 14, "x": 14, "type": "wall"},
-    {"y": 14, "x": 15, "type": "tol"},
-    {"y": 14, "x": 16, "type": "tol"},
-    {"y": 14, "x": 17, "type": "tol"},
-    {"y": 14, "x": 18, "type": "wall"},
-    {"y": 15, "x": 6, "type": "wall"},
-    {"y": 15, "x": 7, "type": "wall"},
-    {"y": 15, "x": 8, "type": "wall"},
-    {"y": 15, "x": 9, "type": "wall"},
-    {"y": 15, "x": 10, "type": "wall"},
-    {"y": 15, "x": 11, "type": "wall"},
-    {"y": 15, "x": 12, "type": "wall"},
-    {"y": 15, "x": 14, "type": "wall"},
-    {"y": 15, "x": 15, "type": "tol"},
-    {"y": 15, "x": 16, "type": "tol"},
-    {"y": 15, "x": 17, "type": "wall"},
-    {"y": 15, "x": 20, "type": "wall"},
-    {"y": 15, "x": 21, "type": "wall"},
-    {"y": 15, "x": 22, "type": "wall"},
-    {"y": 15, "x": 23, "type": "wall"},
-    {"y": 15, "x": 24, "type": "wall"},
-    {"y": 15, "x": 25, "type": "wall"},
-    {"y": 15, "x": 26, "type": "wall"},
-    {"y": 15, "x": 27, "type": "wall"},
-    {"y": 16, "x": 2, "type": "wall"},
-    {"y": 16, "x": 3, "type": "wall"},
-    {"y": 16, "x": 4, "type": "wall"},
-    {"y": 16, "x": 5, "type": "wall"},
-    {"y": 16, "x": 6, "type": "wall"},
-    {"y": 16, "x": 7, "type": "ll"},
-    {"y": 16, "x": 8, "type": "ll"},
-    {"y": 16, "x": 9, "type": "ll"},
-    {"y": 16, "x": 10, "type": "ll"},
-    {"y": 16, "x": 11, "type": "ll"},
-    {"y": 16, "x": 12, "type": "wall"},
-    {"y": 16, "x": 13, "type": "wall"},
-    {"y": 16, "x": 14, "type": "wall"},
-    {"y": 16, "x": 15, "type": "tol"},
-    {"y": 16, "x": 16, "type": "tol"},
-    {"y": 16, "x": 17, "type": "wall"},
-    {"y": 16, "x": 18, "type": "wall"},
-    {"y": 16, "x": 19, "type": "wall"},
-    {"y": 16, "x": 20, "type": "wall"},
-    {"y": 16, "x": 21, "type": "rl"},
-    {"y": 16, "x": 22, "type": "rl"},
-    {"y": 16, "x": 23, "type": "rl"},
-    {"y": 16, "x": 24, "type": "rl"},
-    {"y": 16, "x": 25, "type": "rl"},
-    {"y": 16, "x": 26, "type": "rl"},
-    {"y": 16, "x": 27, "type": "wall"},
-    {"y": 16, "x": 28, "type": "wall"},
-    {"y": 16, "x": 29, "type": "wall"},
-    {"y": 16, "x": 30, "type": "wall"},
-    {"y": 17, "x": 2, "type": "wall"},
-    {"y": 17, "x": 3, "type": "sd"},
-    {"y": 17, "x": 4, "type": "tol"},
-    {"y": 17, "x": 5, "type": "tol"},
-    {"y": 17, "x": 6, "type": "tol"},
-    {"y": 17, "x": 7, "type": "tol"},
-    {"y": 17, "x": 8, "type": "tol"},
-    {"y": 17, "x": 9, "type": "tol"},
-    {"y": 17, "x": 9, "type": "tol"},
-    {"y": 17, "x": 10, "type": "tol"},
-    {"y": 17, "x": 11, "type": "tol"},
-    {"y": 17, "x": 12, "type": "tol"},
-    {"y": 17, "x": 13, "type": "tol"},
-    {"y": 17, "x": 14, "type": "ll"},
-    {"y": 17, "x": 15, "type": "tol"},
-    {"y": 17, "x": 16, "type": "tol"},
-    {"y": 17, "x": 17, "type": "wall"},
-    {"y": 17, "x": 18, "type": "wall"},
-    {"y": 17, "x": 19, "type": "rl"},
-    {"y": 17, "x": 20, "type": "rl"},
-    {"y": 17, "x": 21, "type": "rl"},
-    {"y": 17, "x": 22, "type": "rl"},
-    {"y": 17, "x": 23, "type": "tol"},
-    {"y": 17, "x": 24, "type": "tol"},
-    {"y": 17, "x": 25, "type": "tol"},
-    {"y": 17, "x": 26, "type": "tol"},
-    {"y": 17, "x": 27, "type": "rl"},
-    {"y": 17, "x": 28, "type": "rl"},
-    {"y": 17, "x": 29, "type": "rl"},
-    {"y": 17, "x": 30, "type": "wall"},
-    {"y": 17, "x": 31, "type": "wall"},
-    {"y": 18, "x": 2, "type": "wall"},
-    {"y": 18, "x": 3, "type": "wall"},
-    {"y": 18, "x": 4, "type": "wall"},
-    {"y": 18, "x": 5, "type": "wall"},
-    {"y": 18, "x": 6, "type": "wall"},
-    {"y": 18, "x": 7, "type": "wall"},
-    {"y": 18, "x": 8, "type": "wall"},
-    {"y": 18, "x": 9, "type": "wall"},
-    {"y": 18, "x": 10, "type": "wall"},
-    {"y": 18, "x": 11, "type": "wall"},
-    {"y": 18, "x": 12, "type": "wall"},
-    {"y": 18, "x": 13, "type": "tol"},
-    {"y": 18, "x": 14, "type": "tol"},
-    {"y": 18, "x": 15, "type": "tol"},
-    {"y": 18, "x": 16, "type": "tol"},
-    {"y": 18, "x": 17, "type": "tol"},
-    {"y": 18, "x": 18, "type": "tol"},
-    {"y": 18, "x": 19, "type": "tol"},
-    {"y": 18, "x": 20, "type": "tol"},
-    {"y": 18, "x": 21, "type": "tol"},
-    {"y": 18, "x": 22, "type": "tol"},
-    {"y": 18, "x": 23, "type": "tol"},
-    {"y": 18, "x": 24, "type": "rl"},
-    {"y": 18, "x": 25, "type": "rl"},
-    {"y": 18, "x": 26, "type": "tol"},
-    {"y": 18, "x": 27, "type": "tol"},
-    {"y": 18, "x": 28, "type": "tol"},
-    {"y": 18, "x": 29, "type": "tol"},
-    {"y": 18, "x": 30, "type": "tol"},
-    {"y": 18, "x": 31, "type": "wall"},
-    {"y": 19, "x": 13, "type": "wall"},
-    {"y": 19, "x": 14, "type": "tol"},
-    {"y": 19, "x": 15, "type": "tol"},
-    {"y": 19, "x": 16, "type": "tol"},
-    {"y": 19, "x": 17, "type": "wall"},
-    {"y": 19, "x": 18, "type": "wall"},
-    {"y": 19, "x": 19, "type": "wall"},
-    {"y": 19, "x": 20, "type": "wall"},
-    {"y": 19, "x": 21, "type": "wall"},
-    {"y": 19, "x": 22, "type": "wall"},
-    {"y": 19, "x": 23, "type": "wall"},
-    {"y": 19, "x": 24, "type": "wall"},
-    {"y": 19, "x": 25, "type": "wall"},
-    {"y": 19, "x": 26, "type": "wall"},
-    {"y": 19, "x": 27, "type": "wall"},
-    {"y": 19, "x": 28, "type": "wall"},
-    {"y": 19, "x": 29, "type": "wall"},
-    {"y": 19, "x": 30, "type": "tol"},
-    {"y": 19, "x": 31, "type": "wall"},
-    {"y": 20, "x": 13, "type": "wall"},
-    {"y": 20, "x": 14, "type": "tol"},
-    {"y": 20, "x": 15, "type": "tol"},
-    {"y": 20, "x": 16, "type": "wall"},
-    {"y": 20, "x": 29, "type": "wall"},
-    {"y": 20, "x": 30, "type": "sd"},
-    {"y": 20, "x": 31, "type": "wall"},
-    {"y": 21, "x": 13, "type": "wall"},
-    {"y": 21, "x": 14, "type": "wall"},
-    {"y": 21, "x": 15, "type": "tol"},
-    {"y": 21, "x": 16, "type": "wall"},
-    {"y": 21, "x": 29, "type": "wall"},
-    {"y": 21, "x": 30, "type": "wall"},
-    {"y": 21, "x": 31, "type": "wall"},
-    {"y": 22, "x": 14, "type": "wall"},
-    {"y": 22, "x": 15, "type": "tol"},
-    {"y": 22, "x": 16, "type": "wall"},
-    {"y": 23, "x": 14, "type": "wall"},
-    {"y": 23, "x": 15, "type": "tol"},
-    {"y": 23, "x": 16, "type": "wall"},
-    {"y": 24, "x": 14, "type": "wall"},
-    {"y": 24, "x": 15, "type": "tol"},
-    {"y": 24, "x": 16, "type": "wall"},
-    {"y": 25, "x": 14, "type": "wall"},
-    {"y": 25, "x": 15, "type": "wall"},
-    {"y": 25, "x": 16, "type": "wall"},
-]
+    from respawn import SpawnPoint
 
 mobs = []
 
 
 class Entity(ABC):
-    __number_of_entities: int = 0
+    __slots__ = (
+        "health",
+        "max_health",
+        "mana",
+        "max_mana",
+        "alive",
+        "uid",
+        "in_combat",
+        "name",
+        "archetype",
+        "in_room",
+        "game",
+    )
+
     health: int
     max_health: int
     mana: int
@@ -331,39 +40,47 @@ class Entity(ABC):
     uid: int
     in_combat: bool
     name: str
-    allowed_actions: dict[str, Action]
+    archetype: Archetype  # The actions it can do, shared with everyone that can do the same.
     in_room: BaseRoom | None
+    game: Game
 
     def __init__(
         self,
         _name: str,
         _allowed_actions: list[str],
+        game: Game,
         _health: int = 100,
         _mana: int = 100,
     ):
+        self.game = game
         self.health = _health
         self.max_health = _health
         self.mana = _mana
         self.max_mana = _mana
         self.alive = True
         self.in_combat = False
-        self.name = _name
-        temp = {}
-        for _action in _allowed_actions:
-            temp[_action] = all_actions[_action]
+        self.name = sys.intern(_name)  # Lots of mobs have the same name.
         self.in_room = None
-        self.allowed_actions = temp
-        Entity.__number_of_entities += 1
-        now = time.time_ns()
+        self.archetype = archetype_of(_allowed_actions)
+        # Comes from the game's generator instead of the clock (and how many entities came
+        # before), so seeding it is enough to get the same UIDs when replaying a game.
+        salt = game.rng.getrandbits(64)
         m = hashlib.sha256()
-        data = (
-            f"{self.name},{str(now)},{str(_allowed_actions)}{self.__number_of_entities}"
-        )
+        data = f"{self.name},{str(salt)},{str(_allowed_actions)}"
         m.update(data.encode())
         self.uid = int(m.hexdigest(), 16)
 
-    def commit_action(self, _action: str, target: Entity | None = None):
-        return self.allowed_actions[_action].action(self, target)
+    @property
+    def allowed_actions(self) -> typing.Mapping[str, Action]:
+        return self.archetype.actions
+
+    @property
+    def allowed_codes(self) -> frozenset[int]:
+        """The codes of `allowed_actions`, see `ActionRegistry`."""
+        return self.archetype.codes
+
+    def commit_action(self, code: int, target: Entity | None = None):
+        return ACTIONS.actions[code].action(self, target)
 
     def __repr__(self):
         return str(self)
@@ -410,13 +127,18 @@ class Entity(ABC):
 
     def enforce_aliveness(self) -> None:
         # Makes sure a winning player doesn't "revive" when we are trying to clean it.
-        self.alive = self.health > 0 and self.alive
+        if self.alive and self.health <= 0:
+            self.game.register_death(self)
 
 
 class Mob(Entity):
+    __slots__ = ("spawn_point",)
+
+    spawn_point: SpawnPoint | None  # None for mobs that shouldn't come back.
+
     def update(self):
         self.mana += 4
-        self.health += random.randint(1, 2)
+        self.health += self.game.rng.randint(1, 2)
 
         self.enforce_aliveness()
 
@@ -427,54 +149,53 @@ class Mob(Entity):
                 if player is not None:
                     player.level_up()
 
-        actions = self._handle_combat()
-        super().update(actions=actions)
-        pass
+        # Fighting is handled by the combat manager, only for the rooms where there's a fight.
+        super().update()
 
     def __init__(self, _name: str, _allowed_actions: list[str], game: Game):
-        self.game = game
-        super().__init__(_name, _allowed_actions)
-
-    def _handle_combat(self) -> list[ActionDict] | None:
-        """Allows the mob to act if it is in combat."""
-        res = None
+        self.spawn_point = None
+        super().__init__(_name, _allowed_actions, game)
 
-        if (self.alive) and (self.uid in self.in_room.mob_combatants):
-            if len(self.in_room.player_combatants) == 0:
-                # There are no players left to fight, so stop fighting.
-                self.in_room.mob_combatants.remove(self.uid)
-                self.in_combat = False
-            else:
-                res = self._act_in_combat()
-
-        return res
-
-    def _act_in_combat(self) -> list[ActionDict]:
+    def act_in_combat(self, targets: typing.Sequence[int]) -> list[ActionDict]:
+        """Takes the mob's turn in a fight against the given player uids."""
         # TODO MOBS CHOSE ACTIONS BASED ON AVAILABLE MANA
-        action_choice = random.choice(list(self.allowed_actions.values()))
+        action_choice = self.game.rng.choice(self.archetype.choices)
         if action_choice.requires_target:
-            target_choice = random.choice(list(self.in_room.player_combatants))
+            target_choice = self.game.rng.choice(targets)
             res = self.commit_action(
-                action_choice.name, self.game.get_player(target_choice)
+                action_choice.code, self.game.get_player(target_choice)
             )
         else:
-            res = self.commit_action(action_choice.name)
+            res = self.commit_action(action_choice.code)
 
+        self._send_updates_to_the_room(res)
         return res
 
 
 class Player(Entity):
+    __slots__ = (
+        "level",
+        "level_past_tick",
+        "won",
+        "command_queue",
+        "known_chunks",
+        "cached_chunks",
+    )
+
     level: int
     level_past_tick: int
     command_queue: list[dict[str, Entity | None]]
+    known_chunks: set[Chunk]  # The chunks of the map this player's client has.
+    cached_chunks: set[Chunk]  # The chunks this player's client has saved to disk.
 
     def __init__(self, _name: str, _allowed_actions: list[str], game: Game):
-        super().__init__(_name, _allowed_actions)
+        super().__init__(_name, _allowed_actions, game)
         self.level_past_tick = 0
         self.level = 0
         self.won = False
         self.command_queue = []
-        self.game = game
+        self.known_chunks = set()
+        self.cached_chunks = set()
 
     def update(self) -> list[ActionDict] | FleeDict | MovementDict | int:
         """Updates the player for one tick.
@@ -483,7 +204,7 @@ class Player(Entity):
         Returns a list of ActionDicts if the player did something and None if they didn't
         """
         self.mana += 7
-        self.health += random.randint(1, 3)
+        self.health += self.game.rng.randint(1, 3)
 
         result = self.uid  # If we didn't do anything, return our UID anyways.
 
@@ -492,23 +213,20 @@ class Player(Entity):
             result = self._do(next_command)
 
         if isinstance(result, list):
-            self._start_combats_in_room(result)
+            self._start_combats_in_room(next_command["command"], result)
             super().update(actions=result)
         else:
             super().update()
 
-        self._check_combat_end()
         return result
 
     def _do(
         self, command: CommandDict
     ) -> list[ActionDict] | MovementDict | FleeDict | None:
-        movement_commands = ["north", "east", "south", "west"]
-
         result = None
-        if command["command"] in movement_commands:
+        if command["command"] < FLEE:
             result = self._handle_movement(command)
-        elif command["command"] == "flee":
+        elif command["command"] == FLEE:
             result = self._try_fleeing()
         else:
             result = self.commit_action(command["command"], command["target"])
@@ -522,18 +240,12 @@ class Player(Entity):
         if self.in_combat:
             reason = "combat"
         else:
-            valid_move = self.game.move_player(self, command["command"])
+            valid_move = self.game.move_player(self, ACTIONS.names[command["command"]])
             if valid_move:
-                map_rooms = [room.export() for room in self.game.rooms.values()]
-                rc_update = self._create_room_change_update_list()
-                map_rs = MapUpdate(
-                    type="map_update",
-                    map=map_rooms,
-                    entities=rc_update,
-                )
+                map_rs = self.game.chunks.map_update(self)
         result = {
             "player": self.uid,
-            "direction": command["command"],
+            "direction": ACTIONS.names[command["command"]],
             "success": valid_move,
             "reason": reason,
             "map_update": map_rs,
@@ -544,9 +256,7 @@ class Player(Entity):
     def _create_room_change_update_list(self) -> list[RoomChangeUpdate]:
         room = self.in_room
 
-        mobs = {mob for mob in room.get_mobs()}
-        players = {player for player in room.get_players()}
-        all_entities: set[Entity] = mobs | players
+        all_entities: list[Entity] = [*room.get_mobs(), *room.get_players()]
 
         room_change = [
             RoomChangeUpdate(
@@ -561,37 +271,26 @@ class Player(Entity):
 
         return room_change
 
-    def _start_combats_in_room(self, actions: list[ActionDict]) -> None:
+    def _start_combats_in_room(self, code: int, actions: list[ActionDict]) -> None:
         """Makes sure combats start in the current room if needed."""
+        if not ACTIONS.causes_combat[code]:
+            return
+
         for action in actions:
             # Only start combat with mobs.
             target = self.game.get_mob(action["target"])
-            if (
-                (target is not None)
-                and (action["cast"])
-                and (all_actions[action["name"]])
-            ):
-                self.in_room.player_combatants.add(self.uid)
-                self.in_room.mob_combatants.add(target.uid)
-                self.in_combat = True
-
-    def _check_combat_end(self) -> None:
-        """Ends combat automatically if there's no mobs left that want to fight."""
-        if self.in_combat:
-            # If you're engaged in combat and there's still mob combatants in the room,
-            # then you don't exit combat automatically.
-            self.in_combat = len(self.in_room.mob_combatants) > 0
+            if (target is not None) and (action["cast"]):
+                self.game.combat.start_combat(self.in_room, self, target)
 
     def _try_fleeing(self) -> FleeDict:
         FLEEING_CHANCE = 35  # Percent
         success = False
         was_in_combat = self.in_combat
         if was_in_combat:
-            success = random.randint(1, 100) <= FLEEING_CHANCE
-            self.in_combat = not success
+            success = self.game.rng.randint(1, 100) <= FLEEING_CHANCE
 
         if success:
-            self.in_room.player_combatants.remove(self.uid)
+            self.game.combat.leave_combat(self)
 
         return {"player": self.uid, "fled": success, "combat": was_in_combat}
 
@@ -600,58 +299,63 @@ class Player(Entity):
 
         if self.level >= 5:
             self.won = True
-            self.alive = False  # This make sure we get cleaned from the game :)
+            # This make sure we get cleaned from the game :)
+            self.game.register_death(self)
 
     def add_command_to_queue(
-        self, _command: str, _target: Entity | None = None
+        self, _command: str, _target: Entity | None = None, seq: int | None = None
     ) -> bool:
         """
         Adds a command to the player queue if it's valid.
 
         :param _command: flee, north, east, south, west, one of the skills, clear, nvm
         :param _target: Entity to be targeted or None.
+        :param seq: The number the client gave to the command, if any.
         :return:
         """
-        validity = self._check_command_validity(_command, _target)
+        match _command:
+            case "clear":
+                self.command_queue = []
+                # We did something but there's nothing to queue, so we return false.
+                return False
+            case "nvm":
+                self.command_queue = self.command_queue[:-1]
+                # We did something but there's nothing to queue, so we return false.
+                return False
+
+        # Only the code of the command is queued, so running it doesn't need to look it up again.
+        code = ACTIONS.codes.get(_command)
+        validity = code is not None and self._check_command_validity(code, _target)
 
         if validity:
-            event = {"command": _command, "target": _target}
+            event = {"command": code, "target": _target, "seq": seq}
             self.command_queue.insert(0, event)
 
         return validity
 
-    def _check_command_validity(
-        self, _command: str, _target: Entity | None = None
-    ) -> bool:
+    def queued_seqs(self) -> list[int]:
+        """The numbers the client gave to the queued commands, the next one to run first."""
+        return [
+            command["seq"]
+            for command in reversed(self.command_queue)
+            if command["seq"] is not None
+        ]
+
+    def _check_command_validity(self, code: int, _target: Entity | None = None) -> bool:
         """
         Checks that a command is valid.
 
-        :param _command: flee, north, east, south, west, one of the skills, clear, nvm
+        :param code: The code of the command, see `ActionRegistry`.
         :param _target: Entity to be targeted or None.
         :return:
         """
-        directions = ["north", "east", "south", "west", "flee"]
+        if code <= FLEE:
+            return True  # Anyone can move and flee.
+        if code not in self.allowed_codes:
+            return False
 
-        if _command in self.allowed_actions:
-            # make sure actions that need a target get a target
-            if self.allowed_actions[_command].requires_target and _target is None:
-                return False
-            elif (
-                not self.allowed_actions[_command].requires_target
-            ) and _target is not None:
-                return False
-
-        match _command:
-            case "clear":
-                self.command_queue = []
-                # We did something but there's nothing to queue, so we return false.
-                return False
-            case "nvm":
-                self.command_queue = self.command_queue[:-1]
-                # We did something but there's nothing to queue, so we return false.
-                return False
-            case _:
-                return _command in directions or _command in self.allowed_actions
+        # make sure actions that need a target get a target
+        return ACTIONS.actions[code].requires_target == (_target is not None)
 
 
 class TargetsError(Exception):
@@ -665,11 +369,22 @@ class TargetsError(Exception):
         return self.message
 
 
+class ActionStats(typing.NamedTuple):
+    """A row of the stats table of an `ActionRegistry`."""
+
+    cost: int
+    min_damage: int
+    max_damage: int
+    hit_percentage: int
+
+
+STATS_WIDTH = len(ActionStats._fields)
+# Where each stat is in a row, to read them without building an `ActionStats`.
+COST, MIN_DAMAGE, MAX_DAMAGE, HIT_PERCENTAGE = range(STATS_WIDTH)
+
+
 class Action:
-    __cost: int
-    __min_damage: int
-    __max_damage: int
-    __hit_percentage: int
+    code: int  # Given by the `ActionRegistry` the action is in.
     name: str
     area_of_effect: bool
     requires_target: bool
@@ -705,10 +420,11 @@ class Action:
             _min_damage = temp
         self.area_of_effect = _area_of_effect
         self.requires_target = _requires_target
-        self.__min_damage = _min_damage
-        self.__max_damage = _max_damage
-        self.__cost = _cost
-        self.__hit_percentage = _hit_percentage
+        # Only kept until the action is registered, its stats live in the registry's table.
+        self._stats: ActionStats | None = ActionStats(
+            _cost, _min_damage, _max_damage, _hit_percentage
+        )
+        self.code = -1
         self.name = _name
         self.causes_combat = _causes_combat
 
@@ -739,9 +455,10 @@ class Action:
         """
         action_list: list[ActionDict] = []
 
-        cast = _caster.mana >= self.__cost
+        cost = ACTIONS.stats[self.code * STATS_WIDTH + COST]
+        cast = _caster.mana >= cost
         if cast:
-            _caster.mana -= self.__cost
+            _caster.mana -= cost
 
         if _target is None:
             if self.requires_target:
@@ -781,9 +498,13 @@ class Action:
     def _action_with_target(
         self, cast: bool, caster: Entity, target: Entity
     ) -> ActionDict:
-        dmg = random.randint(self.__min_damage, self.__max_damage)
-        hit_check = random.randint(0, 100)
-        hit = hit_check <= self.__hit_percentage
+        stats = ACTIONS.stats
+        start = self.code * STATS_WIDTH
+        dmg = caster.game.rng.randint(
+            stats[start + MIN_DAMAGE], stats[start + MAX_DAMAGE]
+        )
+        hit_check = caster.game.rng.randint(0, 100)
+        hit = hit_check <= stats[start + HIT_PERCENTAGE]
 
         result = {
             "name": self.name,
@@ -862,12 +583,102 @@ all_actions = {
 }
 
 
+# Commands that aren't actions, they get the first codes. Movement goes first so
+# `code < FLEE` is all it takes to tell a move apart.
+COMMANDS = ["north", "east", "south", "west", "flee"]
+FLEE = COMMANDS.index("flee")
+
+
+class ActionRegistry:
+    """Every command and action by an integer code, so running them is just indexing.
+
+    Codes are only used inside the server: snapshots, events and the clients still use names,
+    so changing the actions doesn't break any of them.
+
+    The stats of every action are packed in `stats`, a row of `STATS_WIDTH` ints per code laid
+    out like `ActionStats`, with zeros for the commands that aren't actions.
+    """
+
+    def __init__(self, actions: typing.Iterable[Action]) -> None:
+        actions = list(actions)
+        self.names: tuple[str, ...] = (*COMMANDS, *(action.name for action in actions))
+        self.codes: dict[str, int] = {
+            name: code for code, name in enumerate(self.names)
+        }
+        # None for the commands that aren't actions.
+        self.actions: tuple[Action | None, ...] = (None,) * len(COMMANDS) + tuple(
+            actions
+        )
+
+        self.stats = array.array("i", [0]) * (STATS_WIDTH * len(self.names))
+        causes_combat = bytearray(len(self.names))
+        for code, action in enumerate(self.actions):
+            if action is not None:
+                action.code = code
+                self.stats[code * STATS_WIDTH : (code + 1) * STATS_WIDTH] = array.array(
+                    "i", action._stats
+                )
+                action._stats = None
+                causes_combat[code] = action.causes_combat
+        # Whether running the code can start a fight.
+        self.causes_combat = bytes(causes_combat)
+
+
+ACTIONS = ActionRegistry(all_actions.values())
+
+
+class Archetype(typing.NamedTuple):
+    """What every entity with the same actions shares, instead of each having its own copy."""
+
+    actions: typing.Mapping[str, Action]  # Read only.
+    codes: frozenset[int]
+    choices: tuple[Action, ...]  # The actions again, for picking one at random.
+
+
+_archetypes: dict[tuple[str, ...], Archetype] = {}
+# What every player can do, so all of them share a single archetype.
+PLAYER_ACTIONS = ["spit", "bite", "eat_berry", "sing", "stomp", "offer_berry"]
+
+
+def archetype_of(action_names: typing.Iterable[str]) -> Archetype:
+    names = tuple(action_names)
+    archetype = _archetypes.get(names)
+    if archetype is None:
+        actions = {name: all_actions[name] for name in names}
+        archetype = _archetypes[names] = Archetype(
+            types.MappingProxyType(actions),
+            frozenset(action.code for action in actions.values()),
+            tuple(actions.values()),
+        )
+
+    return archetype
+
+
 class BaseRoom(ABC):
+    __slots__ = (
+        "__title",
+        "__description",
+        "__linked_rooms",
+        "__mobs",
+        "__players",
+        "__player_uids",
+        "__display_char",
+        "__color",
+        "uid",
+        "display_x",
+        "display_y",
+        "can_entity_step",
+        "mob_combatants",
+        "player_combatants",
+        "events",
+    )
+
     __title: str
     __description: str
     __linked_rooms: dict[str, None | BaseRoom]
-    __mobs: list[Mob]
-    __players: list[Player]
+    __mobs: dict[int, Mob]
+    __players: dict[int, Player]
+    __player_uids: frozenset[int] | None
     __display_char: str
 
     __color: tuple[int, int, int]
@@ -915,8 +726,10 @@ class BaseRoom(ABC):
         self.events = []
         self.__linked_rooms = _linked_rooms
         self.__display_char = _display_char
-        self.__mobs = []
-        self.__players = []
+        # Keyed by uid (dicts keep insertion order) so entering and leaving are O(1).
+        self.__mobs = {}
+        self.__players = {}
+        self.__player_uids = frozenset()
         self.display_x = _display_x
         self.display_y = _display_y
 
@@ -932,7 +745,7 @@ class BaseRoom(ABC):
 
     def export(self) -> ExportedData:
         _mobs: list[MobData] = []
-        for mob in self.__mobs:
+        for mob in self.__mobs.values():
             _mobs.append(
                 {
                     "uid": mob.uid,
@@ -942,7 +755,7 @@ class BaseRoom(ABC):
                 }
             )
         _players: list[PlayerData] = []
-        for player in self.__players:
+        for player in self.__players.values():
             _players.append(
                 {
                     "uid": player.uid,
@@ -975,6 +788,16 @@ class BaseRoom(ABC):
             "exits": _exits,
         }
 
+    def export_kind(self) -> TileKind:
+        """Exports what doesn't change about the room, for drawing the map."""
+        return {
+            "title": self.__title,
+            "description": self.__description,
+            "color": self.__color,
+            "display_char": self.__display_char,
+            "can_entity_step": self.can_entity_step,
+        }
+
     def set_links(self, links: dict[str, None | BaseRoom]):
         self.__linked_rooms = links
 
@@ -984,7 +807,7 @@ class BaseRoom(ABC):
     def show_mobs(self) -> str:
         """:return: get string of mobs in room"""
         ret = ""
-        for mob in self.__mobs:
+        for mob in self.__mobs.values():
             ret += f"{str(mob)}\n"
         return ret
 
@@ -994,15 +817,25 @@ class BaseRoom(ABC):
     def show_players(self) -> str:
         """:return: get string of players in room"""
         ret = ""
-        for player in self.__players:
+        for player in self.__players.values():
             ret += f"{str(player)}\n"
         return ret
 
-    def get_players(self) -> list[Player]:
-        return self.__players
+    def get_players(self) -> typing.ValuesView[Player]:
+        return self.__players.values()
+
+    def get_mobs(self) -> typing.ValuesView[Mob]:
+        return self.__mobs.values()
 
-    def get_mobs(self) -> list[Mob]:
-        return self.__mobs
+    def get_player_uids(self) -> frozenset[int]:
+        """Returns the uids of every player in the room.
+
+        The set is cached until someone enters or leaves, so broadcasting several events
+        to the same room in one tick doesn't rebuild it every time.
+        """
+        if self.__player_uids is None:
+            self.__player_uids = frozenset(self.__players)
+        return self.__player_uids
 
     def add_player(self, player: Player):
         """
@@ -1012,7 +845,8 @@ class BaseRoom(ABC):
         :return:
         """
         player.in_room = self
-        self.__players.append(player)
+        self.__players[player.uid] = player
+        self.__player_uids = None
 
         self.events.append(
             RoomChangeUpdate(
@@ -1026,7 +860,8 @@ class BaseRoom(ABC):
 
     def remove_player(self, player: Player):
         player.in_room = None
-        self.__players.remove(player)
+        del self.__players[player.uid]
+        self.__player_uids = None
 
         self.events.append(
             RoomChangeUpdate(
@@ -1046,11 +881,11 @@ class BaseRoom(ABC):
         :return:
         """
         _mob.in_room = self
-        self.__mobs.append(_mob)
+        self.__mobs[_mob.uid] = _mob
 
     def remove_mob(self, _mob: Mob):
         _mob.in_room = None
-        self.__mobs.remove(_mob)
+        del self.__mobs[_mob.uid]
 
     def get_map_location(self):
         return self.display_x, self.display_y
@@ -1061,10 +896,10 @@ class BaseRoom(ABC):
     def __str__(self):
         ret = f"({self.display_x},{self.display_y}) {self.__class__.__name__}\n"
         ret += "Players\n"
-        for i, player in enumerate(self.__players):
+        for i, player in enumerate(self.__players.values()):
             ret += f"\t{i} {player}\n"
         ret += "Mobs\n"
-        for i, mob in enumerate(self.__mobs):
+        for i, mob in enumerate(self.__mobs.values()):
             ret += f"\t{i} {mob}\n"
         ret += "Links\n"
         for k, v in self.__linked_rooms.items():
@@ -1074,6 +909,8 @@ class BaseRoom(ABC):
 
 
 class Wall(BaseRoom):
+    __slots__ = ()
+
     def __init__(
         self,
         _display_x: int,
@@ -1099,6 +936,8 @@ class Wall(BaseRoom):
 
 
 class TopOfLeaf(BaseRoom):
+    __slots__ = ()
+
     def __init__(
         self,
         _display_x: int,
@@ -1124,6 +963,8 @@ class TopOfLeaf(BaseRoom):
 
 
 class LeftLower(BaseRoom):
+    __slots__ = ()
+
     def __init__(
         self,
         _display_x: int,
@@ -1149,6 +990,8 @@ class LeftLower(BaseRoom):
 
 
 class RoughSide(BaseRoom):
+    __slots__ = ()
+
     def __init__(
         self,
         _display_x: int,
@@ -1174,6 +1017,8 @@ class RoughSide(BaseRoom):
 
 
 class LeftTop(BaseRoom):
+    __slots__ = ()
+
     def __init__(
         self,
         _display_x: int,
@@ -1199,6 +1044,8 @@ class LeftTop(BaseRoom):
 
 
 class SpidersDen(BaseRoom):
+    __slots__ = ()
+
     def __init__(
         self,
         _display_x: int,
@@ -1224,6 +1071,8 @@ class SpidersDen(BaseRoom):
 
 
 class RightTop(BaseRoom):
+    __slots__ = ()
+
     def __init__(
         self,
         _display_x: int,
@@ -1249,6 +1098,8 @@ class RightTop(BaseRoom):
 
 
 class RightLower(BaseRoom):
+    __slots__ = ()
+
     def __init__(
         self,
         _display_x: int,
@@ -1274,12 +1125,6 @@ class RightLower(BaseRoom):
         self.can_entity_step = True
 
 
-class Tile(typing.TypedDict):
-    x: int
-    y: int
-    type: str
-
-
 class ActionDict(typing.TypedDict):
     name: str
     caster: int
@@ -1298,8 +1143,9 @@ class MovementDict(typing.TypedDict):
 
 
 class CommandDict(typing.TypedDict):
-    command: str
+    command: int  # See `ActionRegistry`.
     target: Entity
+    seq: int | None
 
 
 class DisplayDict(typing.TypedDict):
@@ -0,0 +1,195 @@
+"""Reading and writing map files.
+
+A map file is a grid with a byte for each tile, so even huge maps are cheap to load: the file is
+memory mapped and read a row at a time, without ever parsing the whole thing in one go.
+
+The file starts with a `HEADER` (magic, version, where the grid starts on the map, its size and
+where players spawn), followed by the tile types: a byte with how many there are, then the name
+of each as a byte with its length and the name itself. The names are the keys of `ROOMS_MAP`.
+
+Then comes the grid, row by row. Each byte is 0 if there's no tile there, or the tile's type as
+an index into the tile types plus one.
+"""
+from __future__ import annotations
+
+import hashlib
+import mmap
+import struct
+import typing
+
+MAGIC = b"CJMP"
+MAP_VERSION = 1
+
+# Magic, version, x and y of the top left corner, width, height, x and y of the spawn.
+HEADER = struct.Struct("<4sBiiIIii")
+MAX_TILE_TYPES = 255
+
+
+class MapFormatError(Exception):
+    pass
+
+
+class Tile(typing.TypedDict):
+    x: int
+    y: int
+    type: str
+
+
+class GameMap:
+    """A memory mapped map file.
+
+    Use it as a context manager, the file stays open until it's closed.
+    """
+
+    origin: tuple[int, int]
+    width: int
+    height: int
+    spawn: tuple[int, int]
+    tile_types: list[str]
+
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as file:
+            try:
+                self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise MapFormatError(f"{path} is empty")
+
+        try:
+            self._read_header(path)
+        except (struct.error, IndexError):
+            self.close()
+            raise MapFormatError(f"{path} is cut short")
+        except MapFormatError:
+            self.close()
+            raise
+
+    def __enter__(self) -> GameMap:
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._mmap.close()
+
+    def digest(self) -> hashlib._Hash:
+        """A sha256 of the whole file, without reading it into memory."""
+        return hashlib.sha256(self._mmap)
+
+    def tiles(self) -> typing.Iterator[tuple[int, int, int]]:
+        """Yields the x, y and the index in `tile_types` of every tile on the map."""
+        origin_x, origin_y = self.origin
+        for row in range(self.height):
+            start = self._grid_offset + row * self.width
+            line = self._mmap[start : start + self.width]
+            for column, tile in enumerate(line):
+                if tile:
+                    yield origin_x + column, origin_y + row, tile - 1
+
+    def _read_header(self, path: str) -> None:
+        (
+            magic,
+            version,
+            origin_x,
+            origin_y,
+            self.width,
+            self.height,
+            spawn_x,
+            spawn_y,
+        ) = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            raise MapFormatError(f"{path} isn't a map file")
+        if version != MAP_VERSION:
+            raise MapFormatError(f"Can't read a version {version} map")
+
+        self.origin = (origin_x, origin_y)
+        self.spawn = (spawn_x, spawn_y)
+
+        offset = HEADER.size
+        self.tile_types = []
+        for _ in range(self._mmap[offset]):
+            offset += 1
+            length = self._mmap[offset]
+            self.tile_types.append(
+                self._mmap[offset + 1 : offset + 1 + length].decode()
+            )
+            offset += length
+        self._grid_offset = offset + 1
+
+        grid_size = self.width * self.height
+        if len(self._mmap) != self._grid_offset + grid_size:
+            raise MapFormatError(
+                f"{path} is cut short or has something extra at the end"
+            )
+
+        # Take out every byte that's a known tile, whatever's left isn't one. This is done in C,
+        # so it's fast even on a big map.
+        known = bytes(range(len(self.tile_types) + 1))
+        grid = self._mmap[self._grid_offset :]
+        unknown = grid.translate(None, known)
+        if unknown:
+            index = grid.index(unknown[0])
+            x = self.origin[0] + index % self.width
+            y = self.origin[1] + index // self.width
+            raise MapFormatError(f"Unknown tile type {unknown[0] - 1} at ({x}, {y})")
+
+
+def write_map(path: str, tiles: typing.Iterable[Tile], spawn: tuple[int, int]) -> None:
+    """Writes the given tiles to a map file."""
+    tile_list = list(tiles)
+    if not tile_list:
+        raise MapFormatError("A map needs at least one tile")
+
+    tile_types: dict[str, int] = {}
+    for tile in tile_list:
+        tile_types.setdefault(tile["type"], len(tile_types) + 1)
+    if len(tile_types) > MAX_TILE_TYPES:
+        raise MapFormatError(f"A map can't have more than {MAX_TILE_TYPES} tile types")
+
+    origin_x = min(tile["x"] for tile in tile_list)
+    origin_y = min(tile["y"] for tile in tile_list)
+    width = max(tile["x"] for tile in tile_list) - origin_x + 1
+    height = max(tile["y"] for tile in tile_list) - origin_y + 1
+
+    grid = bytearray(width * height)
+    for tile in tile_list:
+        index = (tile["y"] - origin_y) * width + tile["x"] - origin_x
+        if grid[index]:
+            raise MapFormatError(
+                f"There's more than one tile at ({tile['x']}, {tile['y']})"
+            )
+        grid[index] = tile_types[tile["type"]]
+
+    write_grid(path, list(tile_types), grid, (origin_x, origin_y), width, spawn)
+
+
+def write_grid(
+    path: str,
+    tile_types: list[str],
+    grid: bytes | bytearray,
+    origin: tuple[int, int],
+    width: int,
+    spawn: tuple[int, int],
+) -> None:
+    """Writes a grid that's already laid out like in the file (see the top of this module)."""
+    if len(tile_types) > MAX_TILE_TYPES:
+        raise MapFormatError(f"A map can't have more than {MAX_TILE_TYPES} tile types")
+    if not grid or len(grid) % width:
+        raise MapFormatError("The grid has to be a rectangle with at least one tile")
+    height = len(grid) // width
+
+    spawn_column, spawn_row = spawn[0] - origin[0], spawn[1] - origin[1]
+    if not (
+        0 <= spawn_column < width
+        and 0 <= spawn_row < height
+        and grid[spawn_row * width + spawn_column]
+    ):
+        raise MapFormatError(f"There's no tile to spawn on at {spawn}")
+
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, MAP_VERSION, *origin, width, height, *spawn))
+        file.write(bytes([len(tile_types)]))
+        for name in tile_types:
+            encoded = name.encode()
+            file.write(bytes([len(encoded)]) + encoded)
+        file.write(grid)
@@ -0,0 +1,133 @@
+"""Generating big maps, to see how the game holds up in a world bigger than ours.
+
+Usage: `python mapgen.py <path> <width> <height> [seed]`
+
+The map is a maze of clearings separated by walls. The clearings are linked up by a random
+spanning tree, so every one of them can be reached from the spawn, and a few extra openings
+make loops so it isn't a perfect maze. Spiders make their dens in the dead ends.
+"""
+import random
+import sys
+
+if __package__:
+    from game_components.map_format import write_grid
+else:  # Being run directly.
+    from map_format import write_grid
+
+CLEARING_SIZE = 4  # Width and height of each clearing, in tiles.
+LOOP_CHANCE = 0.15  # Chance of an opening between two clearings the maze didn't link.
+SPIDERS_DEN_CHANCE = 0.3  # Chance of a dead end being a spiders' den.
+
+TILE_TYPES = ["wall", "tol", "rs", "lt", "rt", "ll", "rl", "sd"]
+WALL = TILE_TYPES.index("wall") + 1
+SPIDERS_DEN = TILE_TYPES.index("sd") + 1
+# What the clearings that aren't dens are made of, and how often.
+CLEARING_TYPES = [
+    TILE_TYPES.index(name) + 1 for name in ("tol", "rs", "lt", "rt", "ll", "rl")
+]
+CLEARING_WEIGHTS = [60, 20, 5, 5, 5, 5]
+
+
+def generate_map(path: str, width: int, height: int, seed: int | None = None) -> None:
+    """Generates a map of the given size and writes it to a map file.
+
+    The same seed always gives the same map. The random generator is our own, so generating a
+    map doesn't change what the game rolls afterwards.
+    """
+    rng = random.Random(seed)
+
+    step = CLEARING_SIZE + 1  # A clearing and the wall after it.
+    columns = (width - 1) // step
+    rows = (height - 1) // step
+    if columns < 1 or rows < 1:
+        raise ValueError(f"A map needs to be at least {step + 1}x{step + 1}")
+
+    spawn_cell = (rows // 2) * columns + columns // 2
+    links = _spanning_tree(columns, rows, spawn_cell, rng)
+    # Some extra openings, so there's more than one way around.
+    for cell in range(columns * rows):
+        for neighbour in (cell + 1, cell + columns):
+            if (
+                neighbour not in links[cell]
+                and _are_neighbours(cell, neighbour, columns, rows)
+                and rng.random() < LOOP_CHANCE
+            ):
+                links[cell].add(neighbour)
+                links[neighbour].add(cell)
+
+    grid = bytearray([WALL]) * (width * height)
+    for cell, linked in enumerate(links):
+        column, row = cell % columns, cell // columns
+        left, top = 1 + column * step, 1 + row * step
+
+        # Players shouldn't spawn in a den, it would be a short game.
+        if (
+            len(linked) == 1
+            and cell != spawn_cell
+            and rng.random() < SPIDERS_DEN_CHANCE
+        ):
+            tile = SPIDERS_DEN
+        else:
+            tile = rng.choices(CLEARING_TYPES, CLEARING_WEIGHTS)[0]
+
+        for y in range(top, top + CLEARING_SIZE):
+            start = y * width + left
+            grid[start : start + CLEARING_SIZE] = bytes([tile]) * CLEARING_SIZE
+
+        # Open the wall towards the clearings to the east and south, the others do the rest.
+        door = rng.randrange(CLEARING_SIZE)
+        if column + 1 < columns and cell + 1 in linked:
+            grid[(top + door) * width + left + CLEARING_SIZE] = tile
+        if cell + columns in linked:
+            grid[(top + CLEARING_SIZE) * width + left + door] = tile
+
+    # Spawn in the middle of the clearing, with room to the north for the tutorial mite.
+    spawn_x = 1 + (spawn_cell % columns) * step + CLEARING_SIZE // 2
+    spawn_y = 1 + (spawn_cell // columns) * step + CLEARING_SIZE // 2
+    write_grid(path, TILE_TYPES, grid, (0, 0), width, (spawn_x, spawn_y))
+
+
+def _spanning_tree(
+    columns: int, rows: int, start: int, rng: random.Random
+) -> list[set[int]]:
+    """Links up every clearing with a randomized depth first search, returns their links."""
+    links: list[set[int]] = [set() for _ in range(columns * rows)]
+    visited = bytearray(columns * rows)
+
+    visited[start] = True
+    stack = [start]
+    while stack:
+        cell = stack[-1]
+        neighbours = [
+            neighbour
+            for neighbour in (cell - columns, cell + 1, cell + columns, cell - 1)
+            if _are_neighbours(cell, neighbour, columns, rows)
+            and not visited[neighbour]
+        ]
+        if not neighbours:
+            stack.pop()
+            continue
+
+        neighbour = rng.choice(neighbours)
+        links[cell].add(neighbour)
+        links[neighbour].add(cell)
+        visited[neighbour] = True
+        stack.append(neighbour)
+
+    return links
+
+
+def _are_neighbours(cell: int, other: int, columns: int, rows: int) -> bool:
+    if not 0 <= other < columns * rows:
+        return False
+    # Cells next to each other in the list aren't neighbours if they're on different rows.
+    return abs(cell - other) == columns or cell // columns == other // columns
+
+
+if __name__ == "__main__":
+    generate_map(
+        sys.argv[1],
+        int(sys.argv[2]),
+        int(sys.argv[3]),
+        int(sys.argv[4]) if len(sys.argv) > 4 else None,
+    )
@@ -0,0 +1,116 @@
+"""Bringing mobs back to life, so the forest doesn't empty out over time."""
+from __future__ import annotations
+
+import typing
+
+T = typing.TypeVar("T")
+
+RESPAWN_DELAY = 50  # Ticks between a mob dying and another one taking its place.
+
+
+class SpawnPoint(typing.TypedDict):
+    """Where a mob was spawned and what it looked like, so we can spawn it again."""
+
+    x: int
+    y: int
+    name: str
+    actions: list[str]
+
+
+class TimingWheel(typing.Generic[T]):
+    """A hierarchical timing wheel driven by the game's tick counter.
+
+    The first wheel has a slot for each of the next `slots` ticks, and every wheel above it
+    has slots that are `slots` times as wide as the ones below. Timers far in the future sit
+    in a coarse slot and get moved down a wheel when their slot comes up, so advancing a tick
+    only touches the timers that are (almost) due instead of every timer that's scheduled.
+    """
+
+    def __init__(self, slots: int = 64, levels: int = 4, now: int = 0) -> None:
+        self.slots = slots
+        self.levels = levels
+        self.now = now
+        self._wheels: list[list[list[tuple[int, T]]]] = [
+            [[] for _ in range(slots)] for _ in range(levels)
+        ]
+        self._span = slots**levels  # How far ahead we can schedule.
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def schedule(self, item: T, tick: int) -> None:
+        """Schedules an item to come out of the wheel at the given tick."""
+        # Whatever is already due comes out on the next advance.
+        tick = max(tick, self.now + 1)
+        if tick - self.now >= self._span:
+            raise ValueError(f"Can't schedule more than {self._span} ticks ahead")
+
+        self._place(item, tick)
+        self._size += 1
+
+    def advance(self, tick: int) -> list[T]:
+        """Moves the wheel forward up to the given tick and returns every item that became due."""
+        due: list[T] = []
+        while self.now < tick:
+            self.now += 1
+            self._cascade()
+
+            slot = self._wheels[0][self.now % self.slots]
+            if slot:
+                due.extend(item for _, item in slot)
+                self._size -= len(slot)
+                slot.clear()
+
+        return due
+
+    def pending(self) -> typing.Iterator[tuple[int, T]]:
+        """Every scheduled item along with the tick it's due, in no particular order."""
+        for wheel in self._wheels:
+            for slot in wheel:
+                yield from slot
+
+    def _place(self, item: T, tick: int) -> None:
+        delta = tick - self.now
+        level = 0
+        width = 1
+        while delta >= width * self.slots:
+            width *= self.slots
+            level += 1
+
+        self._wheels[level][(tick // width) % self.slots].append((tick, item))
+
+    def _cascade(self) -> None:
+        """Moves timers down from the coarser wheels whose slot just came up."""
+        # Find the highest wheel that just rolled over, then empty its current slot and those
+        # of the wheels below it (highest first, since they may refill the lower slots).
+        level = 0
+        width = 1
+        while level + 1 < self.levels and self.now % (width * self.slots) == 0:
+            width *= self.slots
+            level += 1
+
+        while level > 0:
+            slot = self._wheels[level][(self.now // width) % self.slots]
+            timers = slot[:]
+            slot.clear()
+            for tick, item in timers:
+                self._place(item, tick)
+
+            width //= self.slots
+            level -= 1
+
+
+class Respawner:
+    """Keeps track of the mobs that need to be respawned and when."""
+
+    def __init__(self, delay: int = RESPAWN_DELAY, now: int = 0) -> None:
+        self.delay = delay
+        self.wheel: TimingWheel[SpawnPoint] = TimingWheel(now=now)
+
+    def mob_died(self, spawn_point: SpawnPoint, tick: int) -> None:
+        self.wheel.schedule(spawn_point, tick + self.delay)
+
+    def due(self, tick: int) -> list[SpawnPoint]:
+        """Returns the spawn points that should get their mob back at this tick."""
+        return self.wheel.advance(tick)
@@ -0,0 +1,204 @@
+"""Saving the world to disk every now and then, so a crash doesn't wipe it out.
+
+A snapshot only holds what changes while the game runs: the entities, where they are and what
+they're up to. The map itself is rebuilt from the map data, which is a lot faster than
+spawning everything from scratch and doesn't reroll where the mobs are.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import pickle
+import typing
+import zlib
+
+if __package__:
+    from game_components.game_objects import ACTIONS, Mob, Player
+    from game_components.respawn import Respawner
+else:  # We're imported by game.py being run directly.
+    from game_objects import ACTIONS, Mob, Player
+    from respawn import Respawner
+
+if typing.TYPE_CHECKING:
+    from game import Game
+    from game_objects import Entity
+    from respawn import SpawnPoint
+
+SNAPSHOT_VERSION = 2
+
+# uid, name, allowed actions, health, max health, mana, max mana, location.
+EntityState = tuple[int, str, list[str], int, int, int, int, tuple[int, int]]
+
+
+class PlayerState(typing.NamedTuple):
+    entity: EntityState
+    level: int
+    # Each command along with the UID of its target.
+    command_queue: list[tuple[str, int | None]]
+
+
+class MobState(typing.NamedTuple):
+    entity: EntityState
+    spawn_point: SpawnPoint | None
+
+
+class WorldSnapshot(typing.TypedDict):
+    version: int
+    map_hash: str  # The map it was taken on, the entities are placed by their location.
+    tick: int
+    players: list[PlayerState]
+    mobs: list[MobState]
+    respawns: list[tuple[int, SpawnPoint]]  # When each mob respawns and where.
+
+
+def capture(game: Game) -> WorldSnapshot:
+    """Copies the state of the world into plain data.
+
+    This is the only part that runs in the middle of the game loop. It doesn't do much more than
+    copying numbers around, encoding and writing to disk is left to `save_snapshot`.
+    """
+    players = [
+        PlayerState(
+            _capture_entity(player),
+            player.level,
+            [
+                (ACTIONS.names[command["command"]], _uid_of(command["target"]))
+                for command in player.command_queue
+            ],
+        )
+        for player in game.players.values()
+        if player.alive
+    ]
+    # Players that didn't come back yet should still be around after the next restart.
+    players.extend(
+        PlayerState(_capture_entity(player), player.level, [])
+        for sleeping in game.sleeping_players.values()
+        for player in sleeping
+    )
+
+    mobs = [
+        MobState(_capture_entity(mob), mob.spawn_point)
+        for mob in game.mobs.values()
+        if mob.alive
+    ]
+
+    return {
+        "version": SNAPSHOT_VERSION,
+        "map_hash": game.map_hash,
+        "tick": game.tick,
+        "players": players,
+        "mobs": mobs,
+        "respawns": list(game.respawner.wheel.pending()),
+    }
+
+
+def world_hash(game: Game) -> bytes:
+    """A hash of everything a snapshot holds, to tell whether two games ended up the same."""
+    return hashlib.sha256(repr(capture(game)).encode()).digest()
+
+
+def write_snapshot(path: str, snapshot: WorldSnapshot) -> None:
+    data = zlib.compress(pickle.dumps(snapshot, pickle.HIGHEST_PROTOCOL), 1)
+
+    # Write to a temporary file first, so a crash while writing doesn't ruin the last snapshot.
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as file:
+        file.write(data)
+    os.replace(temporary_path, path)
+
+
+def load_snapshot(path: str) -> WorldSnapshot:
+    """Reads a snapshot written by `write_snapshot`.
+
+    Only load snapshots we wrote ourselves, they're pickles after all.
+    """
+    with open(path, "rb") as file:
+        snapshot: WorldSnapshot = pickle.loads(zlib.decompress(file.read()))
+
+    if snapshot["version"] != SNAPSHOT_VERSION:
+        raise ValueError(f"Can't load a version {snapshot['version']} snapshot")
+
+    return snapshot
+
+
+async def save_snapshot(game: Game, path: str) -> None:
+    """Takes a snapshot of the game and writes it to disk without blocking the game loop."""
+    snapshot = capture(game)
+    await asyncio.to_thread(write_snapshot, path, snapshot)
+
+
+def restore_snapshot(game: Game, snapshot: WorldSnapshot) -> None:
+    """Fills a game that has its map built (but no entities) with the entities of a snapshot.
+
+    Fights don't survive a restart, everyone that was in one got disconnected after all. Players
+    are put to sleep until someone with their name registers again (see `Game.wake_player`).
+
+    Raises `ValueError` if the snapshot was taken on a different map than the game's.
+    """
+    if snapshot["map_hash"] != game.map_hash:
+        raise ValueError(
+            f"The snapshot was taken on another map (with hash {snapshot['map_hash']}), "
+            "start the server with that map or move the snapshot out of the way"
+        )
+
+    game.tick = snapshot["tick"]
+    game.respawner = Respawner(game.respawner.delay, now=game.tick)
+    for tick, spawn_point in snapshot["respawns"]:
+        game.respawner.wheel.schedule(spawn_point, tick)
+
+    for mob_state in snapshot["mobs"]:
+        mob = Mob(mob_state.entity[1], mob_state.entity[2], game)
+        x, y = _restore_entity(mob, mob_state.entity)
+        mob.spawn_point = mob_state.spawn_point
+        game.add_mob(mob, x, y)
+
+    for player_state in snapshot["players"]:
+        player = Player(player_state.entity[1], player_state.entity[2], game)
+        x, y = _restore_entity(player, player_state.entity)
+        player.level = player.level_past_tick = player_state.level
+        player.in_room = game.get_room_at(x, y)
+        game.sleeping_players.setdefault(player.name, []).append(player)
+
+        # Actions can only target mobs. If the target isn't around anymore, forget about it.
+        player.command_queue = [
+            {
+                "command": ACTIONS.codes[command],
+                "target": game.get_mob(target_uid),
+                "seq": None,
+            }
+            for command, target_uid in player_state.command_queue
+            if target_uid is None or target_uid in game.mobs
+        ]
+
+
+def _capture_entity(entity: Entity) -> EntityState:
+    return (
+        entity.uid,
+        entity.name,
+        list(entity.allowed_actions),
+        entity.health,
+        entity.max_health,
+        entity.mana,
+        entity.max_mana,
+        entity.in_room.get_map_location(),
+    )
+
+
+def _restore_entity(entity: Entity, state: EntityState) -> tuple[int, int]:
+    """Puts the captured stats back into a new entity and returns where it should go."""
+    (
+        entity.uid,
+        _,
+        _,
+        entity.health,
+        entity.max_health,
+        entity.mana,
+        entity.max_mana,
+        location,
+    ) = state
+    return location
+
+
+def _uid_of(entity: Entity | None) -> int | None:
+    return entity.uid if entity is not None else None
@@ -0,0 +1,139 @@
+"""Writing down everything players send us, so a session can be played back offline.
+
+Everything random in the game comes from its own generator (`Game.rng`), so with the seed it was
+started with and the requests in the order they came in, running the ticks again ends up in the same world.
+
+A journal starts with a header (`HEADER`) followed by records. Each record is a `RECORD` header
+(kind, tick, length of the payload) and its payload:
+
+- `CONNECT`: the player's UID and their name.
+- `REQUEST`: the UID of the player that sent it and the message, as it came in.
+- `DISCONNECT`: the player's UID.
+- `TICK`: nothing, the tick in the header is the tick that just ended.
+- `CHECKSUM`: a hash of the world (see `snapshot.world_hash`), to check a replay ends up in the same place.
+
+Records are written with the tick the game was at when they came in, so they apply before the
+next `TICK` record.
+"""
+from __future__ import annotations
+
+import asyncio
+import enum
+import struct
+import typing
+
+MAGIC = b"CJJR"
+JOURNAL_VERSION = 1
+
+HEADER = struct.Struct("<4sBQI")  # Magic, version, seed, tick the game started at.
+RECORD = struct.Struct("<BII")  # Kind, tick, length of the payload.
+UID_SIZE = 32  # UIDs are sha256 hashes.
+
+
+class RecordKind(enum.IntEnum):
+    CONNECT = 0
+    REQUEST = 1
+    DISCONNECT = 2
+    TICK = 3
+    CHECKSUM = 4
+
+
+class JournalHeader(typing.NamedTuple):
+    seed: int
+    tick: int
+
+
+class Record(typing.NamedTuple):
+    kind: RecordKind
+    tick: int
+    uid: int | None  # None for `TICK` and `CHECKSUM`.
+    data: bytes  # The name for `CONNECT`, the message for `REQUEST` and the hash for `CHECKSUM`.
+
+
+class InputJournal:
+    """An append-only journal of the players' input.
+
+    Records are only put in a buffer when they come in. The buffer goes to disk in one write
+    when `flush` is called (once a tick), in a thread so the game loop doesn't wait on the disk.
+    """
+
+    def __init__(self, path: str, seed: int, tick: int = 0) -> None:
+        self.path = path
+        self._file = open(path, "wb")
+        self._buffer = bytearray(HEADER.pack(MAGIC, JOURNAL_VERSION, seed, tick))
+
+    def connected(self, tick: int, uid: int, name: str) -> None:
+        self._append(RecordKind.CONNECT, tick, _pack_uid(uid) + name.encode())
+
+    def request(self, tick: int, uid: int, message: str | bytes) -> None:
+        if isinstance(message, str):
+            message = message.encode()
+        self._append(RecordKind.REQUEST, tick, _pack_uid(uid) + message)
+
+    def disconnected(self, tick: int, uid: int) -> None:
+        self._append(RecordKind.DISCONNECT, tick, _pack_uid(uid))
+
+    def ticked(self, tick: int) -> None:
+        self._append(RecordKind.TICK, tick, b"")
+
+    def checksum(self, tick: int, world_hash: bytes) -> None:
+        self._append(RecordKind.CHECKSUM, tick, world_hash)
+
+    async def flush(self) -> None:
+        """Writes whatever was recorded since the last flush."""
+        if not self._buffer:
+            return
+
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        await asyncio.to_thread(self._write, data)
+
+    def close(self) -> None:
+        self._write(bytes(self._buffer))
+        self._buffer.clear()
+        self._file.close()
+
+    def _append(self, kind: RecordKind, tick: int, payload: bytes) -> None:
+        self._buffer += RECORD.pack(kind, tick, len(payload))
+        self._buffer += payload
+
+    def _write(self, data: bytes) -> None:
+        self._file.write(data)
+        self._file.flush()
+
+
+def read_journal(path: str) -> tuple[JournalHeader, list[Record]]:
+    with open(path, "rb") as file:
+        data = file.read()
+
+    magic, version, seed, tick = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f"{path} isn't a journal")
+    if version != JOURNAL_VERSION:
+        raise ValueError(f"Can't read a version {version} journal")
+
+    records = []
+    offset = HEADER.size
+    # A crash can leave half a record at the end, there's nothing to do about that one.
+    while offset + RECORD.size <= len(data):
+        kind, record_tick, length = RECORD.unpack_from(data, offset)
+        offset += RECORD.size
+        if offset + length > len(data):
+            break
+
+        payload = data[offset : offset + length]
+        offset += length
+
+        if kind in (RecordKind.TICK, RecordKind.CHECKSUM):
+            records.append(Record(RecordKind(kind), record_tick, None, payload))
+        else:
+            uid = int.from_bytes(payload[:UID_SIZE], "big")
+            records.append(
+                Record(RecordKind(kind), record_tick, uid, payload[UID_SIZE:])
+            )
+
+    return JournalHeader(seed, tick), records
+
+
+def _pack_uid(uid: int) -> bytes:
+    return uid.to_bytes(UID_SIZE, "big")
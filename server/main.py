@@ -1,9 +1,16 @@
 import asyncio
 import json
+import os
+import shutil
+import sys
+import time
 
 import websockets
-from game_components.game import Game
+from chat import ChatRouter
+from connection_registry import AllExcept, ConnectionRegistry, SetExcept
+from game_components.game import MAP_PATH, Game
 from game_components.game_objects import (
+    PLAYER_ACTIONS,
     ActionDict,
     BaseRoom,
     Entity,
@@ -12,7 +19,10 @@ from game_components.game_objects import (
     Player,
     RoomActionDict,
 )
+from game_components.snapshot import load_snapshot, save_snapshot, world_hash
+from journal import InputJournal
 from mess_up_actions import NO_SHUFFLE, MessedPlayer
+from rate_limit import RateLimiter
 from websockets.exceptions import InvalidMessage
 from websockets.legacy.server import WebSocketServerProtocol
 
@@ -24,24 +34,32 @@ from common.schemas import (
     ActionResponse,
     ActionUpdateMessage,
     ActionWithTargetRequest,
+    BatchResponse,
     ChatMessage,
+    CommandBatch,
     InitializePlayer,
     LevelUpNotification,
-    MapUpdate,
     MovementRequest,
     MovementUpdateMessage,
     PlayerSchema,
+    QueueUpdate,
     RegistrationSuccessful,
     RoomChangeUpdate,
 )
 from common.serialization import deserialize_client_request
 
 TIME_BETWEEN_ROUNDS = 6  # Seconds between each round.
-
-connections: dict[
-    int, WebSocketServerProtocol
-] = {}  # Player UID as key and connection as value.
+SNAPSHOT_PATH = "world.snapshot"
+SNAPSHOT_INTERVAL = 10  # Ticks between each snapshot of the world.
+JOURNAL_DIR = "journals"  # Every run of the server gets its own journal in here.
+JOURNAL_CHECKSUM_INTERVAL = 10  # Ticks between each hash of the world in the journal.
+MAX_BATCH_COMMANDS = 10  # Commands a single `CommandBatch` can queue.
+
+connections = ConnectionRegistry()  # Player UID as key and connection as value.
+chat = ChatRouter(connections)
 messed_players: dict[int, MessedPlayer] = {}
+rate_limiters: dict[int, RateLimiter] = {}  # Look here to see who's getting throttled.
+journal: InputJournal | None = None  # Not there when replaying a journal.
 
 
 def deserialize(message: str | bytes) -> CLIENT_REQUEST:
@@ -55,26 +73,47 @@ async def initialize_player(connection: WebSocketServerProtocol) -> Player:
     if not isinstance(event, InitializePlayer):
         raise InvalidMessage("Expected an `init` message.")
 
-    username = event.username
-    player = Player(
-        username, ["spit", "bite", "eat_berry", "sing", "stomp", "offer_berry"], game
-    )
+    player = join_game(event.username)
+    if event.map_hash == game.map_hash:
+        # No need to send them what they already have.
+        player.cached_chunks = set(event.cached_chunks)
+
+    return player
+
+
+def join_game(username: str) -> Player:
+    """Puts a player with the given name in the game."""
+    # If the server restarted, they might have been around already.
+    player = game.wake_player(username)
+    if player is None:
+        player = Player(username, PLAYER_ACTIONS, game)
+        game.add_player(player, *game.spawn)
 
-    game.add_player(player, 15, 24)
     messed_players[player.uid] = MessedPlayer(player)
 
+    if journal is not None:
+        journal.connected(game.tick, player.uid, username)
+
     return player
 
 
+def leave_game(player_uid: int) -> None:
+    """Takes a player that disconnected out of the game."""
+    player = game.get_player(player_uid)
+    if player is not None:
+        # Not there anymore if they died or won while still connected.
+        game.register_death(player)
+    messed_players.pop(player_uid, None)
+
+    if journal is not None:
+        journal.disconnected(game.tick, player_uid)
+
+
 async def register(websocket: WebSocketServerProtocol) -> None:
     """Adds a player's connections to connections and removes them when they disconnect."""
     registered_player = await initialize_player(websocket)
 
-    map_rooms = [room.export() for room in game.rooms.values()]
-    rc_update = (
-        registered_player._create_room_change_update_list()
-    )  # TODO this isn't private anymore.
-    map_update = MapUpdate(type="map_update", map=map_rooms, entities=rc_update)
+    map_update = game.chunks.map_update(registered_player)
 
     registration_response = RegistrationSuccessful(
         type="registration_successful",
@@ -83,95 +122,126 @@ async def register(websocket: WebSocketServerProtocol) -> None:
             name=registered_player.name,
             allowed_actions=set(registered_player.allowed_actions),
         ),
+        map_hash=game.map_hash,
         map=map_update,
     )
 
     await websocket.send(registration_response.json())
-    connections[registered_player.uid] = websocket
+    connections.add(registered_player.uid, websocket)
 
     try:
-        await handler(websocket)
+        await handler(websocket, registered_player.uid)
     finally:
-        player = game.get_player(registered_player.uid)
-        assert player  # Shouldn't ever be None, so its probably fine to stick an assert here
-        player.alive = False
+        leave_game(registered_player.uid)
+        connections.remove(registered_player.uid)
+        rate_limiters.pop(registered_player.uid, None)
 
-        del connections[registered_player.uid]
 
+async def handler(websocket: WebSocketServerProtocol, player_uid: int) -> None:
+    limiter = rate_limiters[player_uid] = RateLimiter()
 
-async def handler(websocket: WebSocketServerProtocol) -> None:
     async for message in websocket:
-        event = deserialize(message)
-        match event:
-            case ChatMessage():
-                websockets.broadcast(connections.values(), event.json())
-            case ActionWithTargetRequest():
-                await handle_action_with_target(event, websocket)
-            case ActionNoTargetRequest():
-                await handle_action_without_target(event, websocket)
-            case MovementRequest():
-                await handle_movement(event, websocket)
-            case _:
-                raise NotImplementedError(f"Unknown event {event!r}")
+        data = json.loads(message)
+        if not limiter.allow(data):
+            continue  # Too many messages! Drop it before validating it.
+
+        event = deserialize_client_request(data)
+        if journal is not None:
+            journal.request(game.tick, player_uid, message)
+
+        handle_request(event, player_uid)
+
+
+def handle_request(event: CLIENT_REQUEST, player_uid: int) -> None:
+    match event:
+        case ChatMessage():
+            player = game.get_player(player_uid)
+            if player is not None:
+                chat.route(event, player)
+        case ActionWithTargetRequest() | ActionNoTargetRequest() | MovementRequest():
+            _, response = queue_command(event, player_uid)
+            respond(event, player_uid, response)
+        case CommandBatch():
+            handle_command_batch(event, player_uid)
+        case _:
+            raise NotImplementedError(f"Unknown event {event!r}")
+
+
+def handle_command_batch(batch: CommandBatch, requester_uid: int) -> None:
+    """Queues all the commands of the batch, in order, or none of them if any can't be queued."""
+    player = game.get_player(requester_uid)
+    if player is None:
+        return
+
+    responses = []
+    applied = len(batch.commands) <= MAX_BATCH_COMMANDS
+    if not applied:
+        responses = [f"You can't queue more than {MAX_BATCH_COMMANDS} at once!"]
+    else:
+        saved_queue = list(player.command_queue)
+        for command in batch.commands:
+            queued, response = queue_command(command, requester_uid)
+            responses.append(response)
+            applied = applied and queued
+        if not applied:
+            player.command_queue = saved_queue
+
+    response = BatchResponse(
+        type="batch_response",
+        applied=applied,
+        responses=responses,
+        seqs=[command.seq for command in batch.commands],
+        queue=player.queued_seqs(),
+    )
+    connections.send(requester_uid, response.json())
+
 
+def queue_command(
+    req: ActionWithTargetRequest | ActionNoTargetRequest | MovementRequest,
+    requester_uid: int,
+) -> tuple[bool, str]:
+    """Adds a command to the player's queue. Returns whether it worked, and what to tell them."""
+    if req.player != requester_uid:
+        # Only the requester's queue is put back if a batch fails, and it's not theirs anyways.
+        return False, "You can only queue commands for yourself!"
 
-async def handle_action_with_target(
-    req: ActionWithTargetRequest, ws: WebSocketServerProtocol
-):
+    match req:
+        case ActionWithTargetRequest():
+            return queue_action_with_target(req)
+        case ActionNoTargetRequest():
+            return queue_action_without_target(req)
+        case MovementRequest():
+            return queue_movement(req)
+
+
+def queue_action_with_target(req: ActionWithTargetRequest) -> tuple[bool, str]:
     action = messed_players[req.player].actions.get(req.action)
     if action is None:
-        response = ActionResponse(
-            type="action_response", response=f"You can't {req.action}!"
-        )
-    elif action.requires_target:
-        target = game.get_mob(req.target)
+        return False, f"You can't {req.action}!"
+    elif not action.requires_target:
+        return False, f"{req.action} doesn't take any targets!"
 
-        if target is not None:
-            game.get_player(req.player).add_command_to_queue(action.name, target)
-            response = ActionResponse(
-                type="action_response", response="Added action to queue."
-            )
-        else:
-            response = ActionResponse(
-                type="action_response",
-                response="Whatever you were trying to hit is no longer there! (feature)",
-            )
-    else:
-        response = ActionResponse(
-            type="action_response",
-            response=f"{req.action} doesn't take any targets!",
-        )
+    target = game.get_mob(req.target)
+    if target is None:
+        return False, "Whatever you were trying to hit is no longer there! (feature)"
 
-    await ws.send(response.json())
+    game.get_player(req.player).add_command_to_queue(action.name, target, req.seq)
+    return True, "Added action to queue."
 
 
-async def handle_action_without_target(
-    req: ActionNoTargetRequest, ws: WebSocketServerProtocol
-):
+def queue_action_without_target(req: ActionNoTargetRequest) -> tuple[bool, str]:
     action = messed_players[req.player].actions.get(req.action)
 
-    response = None
     if req.action in NO_SHUFFLE:
-        game.get_player(req.player).add_command_to_queue(req.action)
-        response = ActionResponse(
-            type="action_response", response=get_no_shuffle_response(req.action)
-        )
+        game.get_player(req.player).add_command_to_queue(req.action, seq=req.seq)
+        return True, get_no_shuffle_response(req.action)
     elif action is None:
-        response = ActionResponse(
-            type="action_response", response=f"You can't {req.action}!"
-        )
-    elif not action.requires_target:
-        game.get_player(req.player).add_command_to_queue(req.action)
-        response = ActionResponse(
-            type="action_response", response="Added action to queue."
-        )
-    else:
-        response = ActionResponse(
-            type="action_response",
-            response=f"{req.action} needs a target!",
-        )
+        return False, f"You can't {req.action}!"
+    elif action.requires_target:
+        return False, f"{req.action} needs a target!"
 
-    await ws.send(response.json())
+    game.get_player(req.player).add_command_to_queue(req.action, seq=req.seq)
+    return True, "Added action to queue."
 
 
 def get_no_shuffle_response(action: str) -> str:
@@ -184,13 +254,28 @@ def get_no_shuffle_response(action: str) -> str:
     return message
 
 
-async def handle_movement(req: MovementRequest, ws: WebSocketServerProtocol):
+def queue_movement(req: MovementRequest) -> tuple[bool, str]:
     direction = messed_players[req.player].directions[req.direction]
-    game.get_player(req.player).add_command_to_queue(direction)
-
-    response = ActionResponse(type="action_response", response="Added move to queue.")
+    game.get_player(req.player).add_command_to_queue(direction, seq=req.seq)
+
+    return True, "Added move to queue."
+
+
+def respond(
+    req: ActionNoTargetRequest | ActionWithTargetRequest | MovementRequest,
+    requester_uid: int,
+    message: str,
+) -> None:
+    """Answers a request, with what's in the player's queue now so the client can check its copy."""
+    player = game.get_player(req.player)
+    response = ActionResponse(
+        type="action_response",
+        response=message,
+        seq=req.seq,
+        queue=player.queued_seqs() if player is not None else None,
+    )
 
-    await ws.send(response.json())
+    connections.send(requester_uid, response.json())
 
 
 async def websocket_handling() -> None:
@@ -200,36 +285,64 @@ async def websocket_handling() -> None:
 
 async def game_loop():
     """Here we run each tick of the game."""
+    snapshot_task: asyncio.Task | None = None
+
     while True:
         await asyncio.sleep(TIME_BETWEEN_ROUNDS)
-        # HANDLING EACH TICK GOES HERE.
-        await game.update()
+        await run_tick()
 
-        await send_updates(game.out_queue)
+        if journal is not None:
+            await journal.flush()
 
-        players_to_clean = game.clean_the_dead()
+        if game.tick % SNAPSHOT_INTERVAL == 0 and (
+            snapshot_task is None or snapshot_task.done()
+        ):
+            snapshot_task = asyncio.create_task(save_snapshot(game, SNAPSHOT_PATH))
 
-        for player_uid in players_to_clean:
-            if player_uid in connections:
-                connections.pop(player_uid)
+
+async def run_tick() -> int:
+    """Runs a tick of the game, and returns how many events came out of it."""
+    # HANDLING EACH TICK GOES HERE.
+    await game.update()
+
+    events = game.out_queue.qsize()
+    await send_updates(game.out_queue)
+
+    players_to_clean = game.clean_the_dead()
+
+    for player_uid in players_to_clean:
+        connections.remove(player_uid)
+
+    if journal is not None:
+        journal.ticked(game.tick)
+        if game.tick % JOURNAL_CHECKSUM_INTERVAL == 0:
+            journal.checksum(game.tick, world_hash(game))
+
+    return events
 
 
 async def send_updates(out_queue: asyncio.Queue):
-    """Sends all the events in the queue to their respective players."""
+    """Sends all the events in the queue to their respective players.
+
+    Messages are only put in the outbound queue of each player, so this never waits on the network.
+    """
     while not out_queue.empty():
         action = await out_queue.get()
         update: ActionUpdateMessage()
-        player_uids: int | set
+        player_uids: int | set[int] | frozenset[int] | AllExcept | SetExcept
         match action:
             case RoomChangeUpdate():
                 room = game.get_room(action.room_uid)
                 player_uids = get_room_update_uids(room, action.entity_uid)
                 update = action
-            case {"type": (LevelUpNotification() as notif), "uid": uid}:
+            case {
+                "type": (LevelUpNotification() | QueueUpdate()) as notif,
+                "uid": uid,
+            }:
                 player_uids = uid
                 update = notif
             case {"type": (WIN() as win), "uid": player_uid}:
-                player_uids = await get_win_update_uids(player_uid, win)
+                player_uids = get_win_update_uids(player_uid, win)
                 player_name = game.get_player(player_uid).name
                 update = ActionUpdateMessage(
                     type="update",
@@ -276,7 +389,7 @@ async def send_updates(out_queue: asyncio.Queue):
                     message="Time passes by, but you didn't do anything this round!",
                 )
             case {"room_of_death": room, "deceased": deceased}:
-                player_uids = await get_death_update_uids(room, deceased)
+                player_uids = get_death_update_uids(room, deceased)
                 update = ActionUpdateMessage(
                     type="update", message=f"`{deceased.name}` died!"
                 )
@@ -288,18 +401,17 @@ async def send_updates(out_queue: asyncio.Queue):
         match player_uids:
             case int():
                 # Send to a single player.
-                player_connection = connections.get(player_uids)
-                if player_connection is not None:
-                    await player_connection.send(update.json())
-                # else: player disconnected.
-            case set():
+                connections.send(player_uids, update.json())
+                # Nothing happens if the player disconnected.
+            case AllExcept(uid=excluded_uid):
+                # Broadcast to the entire server but one player.
+                connections.broadcast_except(excluded_uid, update.json())
+            case SetExcept(uids=uids, uid=excluded_uid):
+                # Broadcast to multiple players but one.
+                connections.send_to(uids, update.json(), exclude=excluded_uid)
+            case set() | frozenset():
                 # Broadcast to multiple players.
-                player_connections = {
-                    connections.get(player_uid)
-                    for player_uid in player_uids
-                    if connections.get(player_uid) is not None
-                }
-                websockets.broadcast(player_connections, update.json())
+                connections.send_to(player_uids, update.json())
 
 
 def get_movement_message(move: MovementDict) -> str:
@@ -350,45 +462,36 @@ def get_action_update_message(action: ActionDict) -> str:
     return message
 
 
-def get_room_update_uids(room: BaseRoom, caster_uid: int) -> set:
+def get_room_update_uids(room: BaseRoom, caster_uid: int) -> SetExcept:
     """Returns the uids of every player in the room except the caster."""
-    players = room.get_players()
-    uids = {player.uid for player in players if player.uid != caster_uid}
-
-    return uids
+    # The room's own set, the caster is skipped when sending.
+    return SetExcept(room.get_player_uids(), caster_uid)
 
 
-async def get_death_update_uids(room: BaseRoom, deceased: Entity) -> set:
+def get_death_update_uids(
+    room: BaseRoom, deceased: Entity
+) -> frozenset[int] | AllExcept:
     if isinstance(deceased, Player):
         # We must handle the deceased with a bit more care.
-        await handle_dead_player_with_care(deceased.uid)
+        handle_dead_player_with_care(deceased.uid)
         # If a player died then tell the entire server!
-        return {
-            player_uid
-            for player_uid in connections.keys()
-            if player_uid != deceased.uid
-        }
+        return AllExcept(deceased.uid)
     else:
         # If a mob died, only tell the players in the room.
-        return {player.uid for player in room.get_players()}
+        return room.get_player_uids()
 
 
-async def handle_dead_player_with_care(player_uid: int):
+def handle_dead_player_with_care(player_uid: int):
     """Properly notifies the client of it's death."""
     tactful_message = DEATH(type="DEATH")
-    deceased_connection = connections.get(player_uid)
+    connections.send(player_uid, tactful_message.json())
 
-    if deceased_connection is not None:
-        await deceased_connection.send(tactful_message.json())
 
-
-async def get_win_update_uids(winner_uid: int, win: WIN) -> set[int]:
-    winner_connection = connections.get(winner_uid)
-    if winner_connection is not None:
-        await winner_connection.send(win.json())
+def get_win_update_uids(winner_uid: int, win: WIN) -> AllExcept:
+    connections.send(winner_uid, win.json())
 
     # If a player won then tell the entire server!
-    return {player_uid for player_uid in connections.keys() if player_uid != winner_uid}
+    return AllExcept(winner_uid)
 
 
 def get_room_update_message(room_action: RoomActionDict) -> str:
@@ -409,9 +512,39 @@ def get_room_update_message(room_action: RoomActionDict) -> str:
 
 
 async def main() -> None:
-    await asyncio.gather(websocket_handling(), game_loop())
+    await asyncio.gather(websocket_handling(), game_loop(), chat.run())
 
 
 if __name__ == "__main__":
-    game = Game()
-    asyncio.run(main())
+    # Everything random in the game comes from this seed, it's kept in the journal for replays.
+    seed = int.from_bytes(os.urandom(8), "little")
+
+    os.makedirs(JOURNAL_DIR, exist_ok=True)
+    journal_path = os.path.join(
+        JOURNAL_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}.journal"
+    )
+
+    # Another map can be given, like one made with `game_components/mapgen.py`.
+    map_path = sys.argv[1] if len(sys.argv) > 1 else MAP_PATH
+
+    if os.path.exists(SNAPSHOT_PATH):
+        try:
+            game = Game(
+                snapshot=load_snapshot(SNAPSHOT_PATH), map_path=map_path, seed=seed
+            )
+        except ValueError as error:
+            sys.exit(f"Can't restore {SNAPSHOT_PATH}: {error}")
+        # The snapshot gets overwritten while we run, but a replay needs to start from it.
+        shutil.copyfile(SNAPSHOT_PATH, f"{journal_path}.snapshot")
+    else:
+        game = Game(map_path=map_path, seed=seed)
+
+    # Replays need to run on the same map.
+    shutil.copyfile(map_path, f"{journal_path}.map")
+
+    journal = InputJournal(journal_path, seed, game.tick)
+    try:
+        asyncio.run(main())
+    finally:
+        journal.checksum(game.tick, world_hash(game))
+        journal.close()
@@ -0,0 +1,56 @@
+"""Measures how much memory players, mobs and rooms take, to know how many a server can hold.
+
+Usage: `python memory_benchmark.py [how many of each, 100000 by default]`
+
+Only the objects themselves (and whatever they're the only ones holding on to) are counted,
+not the game keeping track of them.
+"""
+import sys
+import tracemalloc
+import typing
+
+from game_components.game import Game
+from game_components.game_objects import PLAYER_ACTIONS, Mob, Player, TopOfLeaf
+
+COUNT = 100_000
+
+
+class MemoryResult(typing.NamedTuple):
+    kind: str
+    count: int
+    total: int  # In bytes.
+
+    def __str__(self) -> str:
+        return (
+            f"{self.kind}: {self.total / self.count:.0f} bytes each "
+            f"({self.total / 2**20:.1f}MiB for {self.count})"
+        )
+
+
+def measure(
+    kind: str, count: int, make: typing.Callable[[int], object]
+) -> MemoryResult:
+    """Makes `count` objects and keeps them around, to see how much memory that took."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = [make(i) for i in range(count)]
+    total = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    # The list holding them isn't part of it.
+    total -= sys.getsizeof(objects)
+    return MemoryResult(kind, count, total)
+
+
+def memory_benchmark(count: int = COUNT) -> list[MemoryResult]:
+    game = Game()
+    return [
+        measure("player", count, lambda i: Player(f"player{i}", PLAYER_ACTIONS, game)),
+        measure("mob", count, lambda i: Mob("Mite", ["annoy"], game)),
+        measure("room", count, lambda i: TopOfLeaf(i, 0)),
+    ]
+
+
+if __name__ == "__main__":
+    for result in memory_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else COUNT):
+        print(result)
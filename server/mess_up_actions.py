@@ -1,14 +1,72 @@
 """This is (one of) our bug(s)!"""
-import copy
+import math
 import random
 import typing
 
 from game_components.game_objects import Action, Player
 
-K = typing.TypeVar("K")
 V = typing.TypeVar("V")
 
 NO_SHUFFLE = ["nvm", "clear", "flee"]  # It would be funny tho.
+DIRECTIONS = ["north", "east", "south", "west"]
+
+
+class ScrambleTable(typing.Generic[V]):
+    """Every way of scrambling some names, shared by everyone that has those names.
+
+    A scramble is just a number. The names are split in groups, and a name is only ever mapped
+    to the value of another name in its group. The dict a scramble stands for is built the first
+    time someone gets it, and then shared with everyone else that gets the same one.
+    """
+
+    def __init__(
+        self, groups: list[list[tuple[str, V]]], shuffle_names: bool = True
+    ) -> None:
+        self.groups = [group for group in groups if group]
+        # Directions used to only have their values shuffled, this keeps drawing the same
+        # scrambles from the same seed.
+        self.shuffle_names = shuffle_names
+        self._scrambles: dict[int, dict[str, V]] = {}
+
+    def shuffle(self, rng: random.Random) -> int:
+        """Picks a random scramble."""
+        scramble = 0
+        for group in self.groups:
+            names = list(range(len(group)))
+            if self.shuffle_names:
+                rng.shuffle(names)
+            values = list(range(len(group)))
+            rng.shuffle(values)
+
+            permutation = [0] * len(group)
+            for name, value in zip(names, values):
+                permutation[name] = value
+            scramble = scramble * math.factorial(len(group)) + _rank(permutation)
+
+        return scramble
+
+    def __getitem__(self, scramble: int) -> dict[str, V]:
+        mapping = self._scrambles.get(scramble)
+        if mapping is None:
+            mapping = self._scrambles[scramble] = self._build(scramble)
+        return mapping
+
+    def _build(self, scramble: int) -> dict[str, V]:
+        mapping = {}
+        for group in reversed(self.groups):
+            scramble, rank = divmod(scramble, math.factorial(len(group)))
+            permutation = _unrank(rank, len(group))
+            for (name, _), value_index in zip(group, permutation):
+                mapping[name] = group[value_index][1]
+
+        return mapping
+
+
+DIRECTION_SCRAMBLES: ScrambleTable[str] = ScrambleTable(
+    [[(direction, direction) for direction in DIRECTIONS]], shuffle_names=False
+)
+# Everyone has the same actions, so there's usually a single one of these.
+_action_scrambles: dict[tuple[str, ...], ScrambleTable[Action]] = {}
 
 
 class MessedPlayer:
@@ -17,49 +75,67 @@ class MessedPlayer:
     How to use:
     When the client tries to do something like `move north` do:
     `self.directions["north"]` and that'll return a messed up direction that the server should execute instead.
+
+    Only the number of each scramble is kept here, the dicts are shared with every other player
+    that got the same one.
     """
 
     def __init__(self, player: Player) -> None:
-        self.player = player
-        self.actions = _mess_up_actions(player)
-        self.directions = _mess_up_directions()
-
-    def mess_up_again(self):
-        """In case we want to reshuffle the players actions."""
-        self.actions = _mess_up_actions(self.player)
-        self.directions = _mess_up_directions()
+        self.rng = player.game.rng
+        self.action_scrambles = _action_scrambles_of(player)
+        self.mess_up_again()
 
+    @property
+    def actions(self) -> dict[str, Action]:
+        return self.action_scrambles[self.action_scramble]
 
-def _mess_up_directions() -> dict[str, str]:
-    """Takes the direction strings and assigns them to a different direction."""
-    directions = ["north", "east", "south", "west"]
-    shuffled_directions = copy.copy(directions)
-    random.shuffle(shuffled_directions)
+    @property
+    def directions(self) -> dict[str, str]:
+        return DIRECTION_SCRAMBLES[self.direction_scramble]
 
-    return dict(zip(directions, shuffled_directions))
-
-
-def _mess_up_actions(player: Player) -> dict[str, Action]:
-    """Takes the action strings a player can do and assigns them to a different action."""
-    require_target: dict[str, Action] = {}
-    no_target: dict[str, Action] = {}
-
-    for name, action in player.allowed_actions.items():
-        if action.requires_target:
-            require_target[name] = action
-        else:
-            no_target[name] = action
-
-    # We don't really care about sharing a dict. But we don't want a non-target action to be
-    # called with a target or viceversa.
-    return shuffled_dict(require_target) | shuffled_dict(no_target)
-
-
-def shuffled_dict(dict_: dict[K, V]) -> dict[K, V]:
-    """Return a dict with its keys and values shuffled around."""
-    shuffled_keys = list(dict_)
-    random.shuffle(shuffled_keys)
-    shuffled_values = list(dict_.values())
-    random.shuffle(shuffled_values)
-
-    return dict(zip(shuffled_keys, shuffled_values))
+    def mess_up_again(self):
+        """In case we want to reshuffle the players actions."""
+        self.action_scramble = self.action_scrambles.shuffle(self.rng)
+        self.direction_scramble = DIRECTION_SCRAMBLES.shuffle(self.rng)
+
+
+def _action_scrambles_of(player: Player) -> ScrambleTable[Action]:
+    """The scrambles of the actions a player can do."""
+    names = tuple(player.allowed_actions)
+    table = _action_scrambles.get(names)
+    if table is None:
+        # We don't want a non-target action to be called with a target or viceversa.
+        require_target = []
+        no_target = []
+        for name, action in player.allowed_actions.items():
+            if action.requires_target:
+                require_target.append((name, action))
+            else:
+                no_target.append((name, action))
+
+        table = _action_scrambles[names] = ScrambleTable([require_target, no_target])
+
+    return table
+
+
+def _rank(permutation: list[int]) -> int:
+    """The position of the permutation among all of its length, in lexicographic order."""
+    rank = 0
+    remaining = sorted(permutation)
+    for i, value in enumerate(permutation):
+        index = remaining.index(value)
+        rank += index * math.factorial(len(permutation) - i - 1)
+        del remaining[index]
+
+    return rank
+
+
+def _unrank(rank: int, length: int) -> list[int]:
+    """The permutation at the given position, the opposite of `_rank`."""
+    remaining = list(range(length))
+    permutation = []
+    for i in range(length):
+        index, rank = divmod(rank, math.factorial(length - i - 1))
+        permutation.append(remaining.pop(index))
+
+    return permutation
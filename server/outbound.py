@@ -0,0 +1,143 @@
+"""Sending messages to players without ever waiting on the network."""
+import asyncio
+import collections
+import enum
+
+from websockets.exceptions import ConnectionClosed
+from websockets.legacy.server import WebSocketServerProtocol
+
+from common.schemas import ActionUpdateMessage
+
+OUTBOUND_QUEUE_SIZE = 256  # Messages that can be waiting to be sent to a single player.
+
+
+class Priority(enum.IntEnum):
+    LOW = 0  # Stuff happening around the player: chat, room events, server-wide announcements.
+    HIGH = 1  # Stuff happening to the player: responses, the results of their actions, dying...
+
+
+class SlowConsumerPolicy(enum.Enum):
+    """What to do when a player can't keep up with the messages we send them."""
+
+    DROP = "drop"  # Drop low priority messages to make room.
+    COALESCE = "coalesce"  # Replace the low priority messages with a note saying they were missed.
+    DISCONNECT = "disconnect"  # Kick them.
+
+
+SLOW_CONSUMER_POLICY = SlowConsumerPolicy.COALESCE
+
+
+class OutboundQueue:
+    """A bounded queue of messages for a single player, drained by its own writer task.
+
+    Pushing never waits, so one player with a full TCP buffer can't hold up everyone else
+    (or the next tick). When the queue fills up the `policy` decides what gives.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocketServerProtocol,
+        maxsize: int = OUTBOUND_QUEUE_SIZE,
+        policy: SlowConsumerPolicy = SLOW_CONSUMER_POLICY,
+    ) -> None:
+        self.websocket = websocket
+        self.maxsize = maxsize
+        self.policy = policy
+        self.dropped = 0  # Messages that never made it to the player.
+        self._frames: collections.deque[tuple[Priority, str]] = collections.deque()
+        self._ready = asyncio.Event()
+        self._closing = False
+        self._task: asyncio.Task | None = None
+        # The loop only keeps a weak reference to tasks, this one has to outlive `_disconnect`.
+        self._close_task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self.run())
+
+    def close(self) -> None:
+        """Stops the writer once it's done sending what's already queued."""
+        self._closing = True
+        self._ready.set()
+
+    def push(self, frame: str, priority: Priority = Priority.HIGH) -> None:
+        if self._closing:
+            return
+
+        if len(self._frames) >= self.maxsize and not self._make_room(priority):
+            self.dropped += 1
+            return
+
+        self._frames.append((priority, frame))
+        self._ready.set()
+
+    async def run(self) -> None:
+        try:
+            while True:
+                await self._ready.wait()
+                self._ready.clear()
+
+                while self._frames:
+                    _, frame = self._frames.popleft()
+                    await self.websocket.send(frame)
+
+                if self._closing:
+                    break
+        except ConnectionClosed:
+            pass  # They're gone, nothing to send anymore.
+
+    def _make_room(self, priority: Priority) -> bool:
+        """Applies the slow consumer policy, returns False if the new message should be dropped."""
+        match self.policy:
+            case SlowConsumerPolicy.DISCONNECT:
+                self._disconnect()
+                return False
+            case SlowConsumerPolicy.DROP:
+                if priority == Priority.LOW:
+                    return False
+                # Make room by dropping the oldest low priority message.
+                for i, (queued_priority, _) in enumerate(self._frames):
+                    if queued_priority == Priority.LOW:
+                        del self._frames[i]
+                        self.dropped += 1
+                        return True
+            case SlowConsumerPolicy.COALESCE:
+                if self._coalesce():
+                    return True
+
+        # Not even the important stuff is getting through.
+        self._disconnect()
+        return False
+
+    def _coalesce(self) -> bool:
+        """Replaces every queued low priority message with a single note about what was missed."""
+        frames: collections.deque[tuple[Priority, str]] = collections.deque()
+        missed = 0
+        for priority, frame in self._frames:
+            if priority == Priority.LOW:
+                if missed == 0:
+                    frames.append((priority, ""))  # Placeholder for the note.
+                missed += 1
+            else:
+                frames.append((priority, frame))
+
+        if missed <= 1:
+            return False
+
+        note = ActionUpdateMessage(
+            type="update",
+            message=f"You were lagging behind, so {missed} updates were skipped!",
+        ).json()
+        self._frames = collections.deque(
+            (priority, frame or note) for priority, frame in frames
+        )
+        self.dropped += missed - 1
+        return True
+
+    def _disconnect(self) -> None:
+        self._closing = True
+        self._frames.clear()
+        self._ready.set()
+        # Not from the writer, it might be stuck sending to them.
+        self._close_task = asyncio.create_task(
+            self.websocket.close(1008, "Too slow to keep up.")
+        )
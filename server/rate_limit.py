@@ -0,0 +1,89 @@
+"""Keeps a single client from flooding the server with messages.
+
+Messages are limited once they're parsed as JSON, but before they're validated into requests,
+which is most of the work of deserializing them.
+"""
+import collections
+import time
+import typing
+
+OTHER = "other"  # Every message that doesn't have a class of its own.
+
+# Class of message: (tokens refilled per second, size of the bucket).
+RATE_LIMITS: dict[str, tuple[float, int]] = {
+    "chat": (1, 5),
+    "action": (2, 10),
+    "move": (2, 10),
+    # On top of this, each command in a batch is charged to its own class.
+    "batch": (1, 5),
+    # Nothing else should be sent after joining, so hardly any of it goes through.
+    OTHER: (0.2, 1),
+}
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def available(self) -> float:
+        """How many tokens are in the bucket right now."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return self.tokens
+
+    def take(self, tokens: int = 1) -> bool:
+        """Takes tokens from the bucket, returns False (taking none) if there weren't enough."""
+        if self.available() < tokens:
+            return False
+
+        self.tokens -= tokens
+        return True
+
+
+class RateLimiter:
+    """The token buckets of a single connection, one for each class of message.
+
+    The limits need an `OTHER` class, for the messages that don't have a class of their own.
+
+    `throttled` counts how many messages of each class were dropped.
+    """
+
+    def __init__(self, limits: dict[str, tuple[float, int]] = RATE_LIMITS) -> None:
+        self.buckets = {
+            message_class: TokenBucket(rate, capacity)
+            for message_class, (rate, capacity) in limits.items()
+        }
+        self.throttled: collections.Counter[str] = collections.Counter()
+
+    def allow(self, message: typing.Any) -> bool:
+        """Checks if a parsed (but not yet validated) message can go through.
+
+        A batch only goes through if each of its commands would have on its own, and uses up
+        their tokens too, so batching doesn't get anyone more commands in.
+        """
+        message_class = self._classify(message)
+        charges = collections.Counter([message_class])
+        if message_class == "batch" and isinstance(message.get("commands"), list):
+            charges.update(self._classify(command) for command in message["commands"])
+
+        if all(
+            self.buckets[charged].available() >= tokens
+            for charged, tokens in charges.items()
+        ):
+            for charged, tokens in charges.items():
+                self.buckets[charged].take(tokens)
+            return True
+
+        self.throttled[message_class] += 1
+        return False
+
+    def _classify(self, message: typing.Any) -> str:
+        # By the top level "type" once parsed, the raw text can be written to look like anything.
+        message_type = message.get("type") if isinstance(message, dict) else None
+        if isinstance(message_type, str) and message_type in self.buckets:
+            return message_type
+        return OTHER
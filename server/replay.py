@@ -0,0 +1,92 @@
+"""Plays a recorded journal back against the game, as fast as it can.
+
+Usage: `python replay.py journals/<journal>`
+
+Nobody's connected while replaying, so whatever would be sent to the players goes nowhere.
+"""
+import asyncio
+import os
+import sys
+import time
+
+import main
+from game_components.game import MAP_PATH, Game
+from game_components.snapshot import load_snapshot, world_hash
+from journal import Record, RecordKind, read_journal
+
+
+class ReplayDivergedError(Exception):
+    """The replayed game doesn't match what happened when the journal was recorded."""
+
+
+def start_replay(path: str) -> tuple[Game, list[Record]]:
+    """Sets up the game the journal was recorded against, and returns it with the records."""
+    header, records = read_journal(path)
+
+    snapshot = None
+    if os.path.exists(f"{path}.snapshot"):
+        snapshot = load_snapshot(f"{path}.snapshot")
+    elif header.tick != 0:
+        raise FileNotFoundError(
+            f"The journal starts at tick {header.tick}, but {path}.snapshot is missing"
+        )
+
+    # Journals from before we kept the map around were played on ours.
+    map_path = f"{path}.map" if os.path.exists(f"{path}.map") else MAP_PATH
+
+    main.journal = None  # Don't record the replay.
+    main.game = Game(snapshot=snapshot, map_path=map_path, seed=header.seed)
+
+    return main.game, records
+
+
+async def apply_record(game: Game, record: Record) -> int:
+    """Does what the record says happened. Returns how many events came out of it, if it's a tick."""
+    match record.kind:
+        case RecordKind.CONNECT:
+            player = main.join_game(record.data.decode())
+            if player.uid != record.uid:
+                raise ReplayDivergedError(
+                    f"`{player.name}` got a different UID at tick {record.tick}"
+                )
+        case RecordKind.REQUEST:
+            # Only requests that deserialized get recorded, and the server doesn't expect
+            # handling one to fail. If it does now, it's a bug (or the replay went off course).
+            main.handle_request(main.deserialize(record.data), record.uid)
+        case RecordKind.DISCONNECT:
+            main.leave_game(record.uid)
+        case RecordKind.TICK:
+            events = await main.run_tick()
+            main.chat.flush()
+            if game.tick != record.tick:
+                raise ReplayDivergedError(
+                    f"Expected tick {record.tick}, but the game is at tick {game.tick}"
+                )
+            return events
+        case RecordKind.CHECKSUM:
+            if world_hash(game) != record.data:
+                raise ReplayDivergedError(
+                    f"The world isn't the same as it was at tick {record.tick}"
+                )
+
+    return 0
+
+
+async def replay(path: str) -> Game:
+    """Replays a journal and returns the game as it was when the journal ended."""
+    game, records = start_replay(path)
+    for record in records:
+        await apply_record(game, record)
+
+    return game
+
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    replayed = asyncio.run(replay(sys.argv[1]))
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"Replayed {replayed.tick} ticks in {elapsed:.3f}s, "
+        f"{len(replayed.players)} players and {len(replayed.mobs)} mobs left standing."
+    )